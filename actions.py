@@ -0,0 +1,120 @@
+import time
+import threading
+from collections import deque
+from metrics import METRICS
+
+
+# ========= 设备动作队列 =========
+class ActionQueue:
+    """单台设备的点击/宏队列，在独立线程中执行，识别线程只负责入队。
+    每个动作由若干步 (等待秒数, x, y) 组成：单次点击只有一步，宏（如育成结束的点击序列）有多步。
+    - 同名动作已在排队或执行时，新的同名动作被抑制（按钮在连续多帧中都能识别到）；
+    - 有宏在排队或执行时，单次点击一律被抑制，避免打乱宏的点击顺序；
+    - action_latency 记录入队到第一次点击的延迟。
+    sleep_func 不为 None 时（离线回放）在调用线程内同步执行，保证结果可复现。
+    """
+
+    def __init__(self, tap_func, sleep_func=None, device=""):
+        self._tap = tap_func
+        self._sleep = sleep_func
+        self.device = device
+        self._pending = deque()
+        self._names = set()       # 排队或执行中的动作名
+        self._macros = 0          # 排队或执行中的宏数量
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = 0
+        self.done = 0
+        self.suppressed = 0
+        self.total_latency = 0.0
+
+    @property
+    def busy(self):
+        """是否有宏在排队或执行"""
+        return self._macros > 0
+
+    def tap(self, x, y, name="tap"):
+        """单次点击；被抑制时返回 False"""
+        return self.submit(name, ((0, x, y),))
+
+    def macro(self, name, steps):
+        """按顺序执行 steps 中的 (等待秒数, x, y)；被抑制时返回 False"""
+        return self.submit(name, tuple(steps))
+
+    def submit(self, name, steps):
+        is_macro = len(steps) > 1
+        with self._cond:
+            if self._stop.is_set() or name in self._names or (self._macros and not is_macro):
+                self.suppressed += 1
+                METRICS.inc("actions", device=self.device, action=name, result="suppressed")
+                return False
+            self._names.add(name)
+            if is_macro:
+                self._macros += 1
+            action = (name, steps, is_macro, time.monotonic())
+            if self._sleep is None:
+                self._pending.append(action)
+                self._ensure_thread()
+                self._cond.notify()
+                return True
+        self._execute(action)
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"actions-{self.device}", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                action = self._pending.popleft()
+            self._execute(action)
+
+    def _execute(self, action):
+        name, steps, is_macro, queued_at = action
+        result = "done"
+        try:
+            for i, (delay, x, y) in enumerate(steps):
+                if delay and self._wait(delay):
+                    result = "cancelled"
+                    break
+                if i == 0:
+                    latency = time.monotonic() - queued_at
+                    self.started += 1
+                    self.total_latency += latency
+                    METRICS.observe("action_latency", latency, device=self.device, action=name)
+                self._tap(x, y)
+        finally:
+            with self._cond:
+                self._names.discard(name)
+                if is_macro:
+                    self._macros -= 1
+                if result == "done":
+                    self.done += 1
+            METRICS.inc("actions", device=self.device, action=name, result=result)
+
+    def _wait(self, seconds):
+        """等待 seconds 秒，停止时提前返回 True"""
+        if self._sleep is not None:
+            self._sleep(seconds)
+            return False
+        return self._stop.wait(seconds)
+
+    def stop(self, wait=True):
+        """停止执行线程，未执行的动作丢弃、执行中的宏在下一次等待时中止"""
+        with self._cond:
+            self._stop.set()
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread is not None and wait:
+            self._thread.join(timeout=2)
+
+    def describe(self):
+        avg = self.total_latency / self.started * 1000 if self.started else 0.0
+        return f"点击动作：执行 {self.done} 次，抑制重复 {self.suppressed} 次，平均延迟 {avg:.0f}ms"
@@ -0,0 +1,185 @@
+import os
+import socket
+import select
+import threading
+from functools import lru_cache
+
+# ========= ADB server 地址 =========
+ADB_SERVER_HOST = os.environ.get("ADB_SERVER_HOST", "127.0.0.1")
+ADB_SERVER_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+ADB_SOCKET_TIMEOUT = 5  # 秒
+
+
+class AdbError(Exception):
+    """ADB server 返回 FAIL 或连接异常"""
+
+
+# ========= smart-socket 协议基础 =========
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise AdbError("连接被 ADB server 关闭")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(256 * 1024)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _drain(sock):
+    """读掉常驻会话积压的输出（会话不读取输出，积压会堵塞设备端）。
+    对端已关闭会话（读到 EOF 或连接错误）时返回 False
+    """
+    while True:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return True
+        try:
+            if not sock.recv(64 * 1024):
+                return False
+        except OSError:
+            return False
+
+
+def _send_request(sock, payload):
+    """发送 4 位十六进制长度前缀的请求并检查 OKAY/FAIL"""
+    data = payload.encode("utf-8")
+    sock.sendall(b"%04x" % len(data) + data)
+    status = _recv_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        length = int(_recv_exact(sock, 4), 16)
+        raise AdbError(_recv_exact(sock, length).decode("utf-8", "replace"))
+    raise AdbError(f"未知响应：{status!r}")
+
+
+# ========= ADB 客户端 =========
+class AdbClient:
+    """直接与 adb server（默认 localhost:5037）通信，不再为每次调用启动 adb 进程。
+    smart-socket 中每个服务流只能使用一次，因此截图/带输出的 shell 使用短连接；
+    点击等无需输出的命令走每台设备一条常驻的 exec:sh 会话（连接池）。
+    """
+
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT, timeout=ADB_SOCKET_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sessions = {}
+        self._session_locks = {}  # 每台设备一把锁：连接和发送都只持有该设备的锁
+        self._sessions_lock = threading.Lock()  # 只保护上面两个字典，不在持有时做网络操作
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _open_service(self, serial, service):
+        """切换到指定设备的 transport 并打开服务，返回已就绪的 socket"""
+        sock = self._connect()
+        try:
+            _send_request(sock, f"host:transport:{serial}")
+            _send_request(sock, service)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _run_service(self, serial, service):
+        sock = self._open_service(serial, service)
+        try:
+            return _recv_all(sock)
+        finally:
+            sock.close()
+
+    def devices(self):
+        """返回 [(serial, state), ...]"""
+        sock = self._connect()
+        try:
+            _send_request(sock, "host:devices")
+            length = int(_recv_exact(sock, 4), 16)
+            raw = _recv_exact(sock, length).decode("utf-8", "replace")
+        finally:
+            sock.close()
+        result = []
+        for line in raw.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                result.append((parts[0], parts[1]))
+        return result
+
+    def exec_out(self, serial, command):
+        """等价于 adb exec-out：返回命令的原始二进制输出"""
+        return self._run_service(serial, f"exec:{command}")
+
+    def screencap(self, serial, png=True):
+        return self.exec_out(serial, "screencap -p" if png else "screencap")
+
+    def shell(self, serial, command):
+        """执行 shell 命令并返回文本输出"""
+        return self._run_service(serial, f"shell:{command}").decode("utf-8", "replace")
+
+    def _session_lock(self, serial):
+        with self._sessions_lock:
+            lock = self._session_locks.get(serial)
+            if lock is None:
+                lock = self._session_locks[serial] = threading.Lock()
+            return lock
+
+    def shell_async(self, serial, command):
+        """通过常驻会话发送命令，不等待输出；会话断开时重连一次。
+        已被设备端关闭的会话写入可能仍然成功，因此发送前先读空会话，读到 EOF 则重连。
+        连接慢或离线的设备只阻塞发往它自己的命令
+        """
+        line = (command.rstrip("\n") + "\n").encode("utf-8")
+        with self._session_lock(serial):
+            for attempt in range(2):
+                with self._sessions_lock:
+                    sock = self._sessions.get(serial)
+                if sock is not None and not _drain(sock):
+                    self._drop_session(serial, sock)
+                    sock = None
+                if sock is None:
+                    sock = self._open_service(serial, "exec:sh")
+                    with self._sessions_lock:
+                        self._sessions[serial] = sock
+                try:
+                    sock.sendall(line)
+                    return
+                except OSError:
+                    self._drop_session(serial, sock)
+                    if attempt:
+                        raise
+
+    def _drop_session(self, serial, sock):
+        with self._sessions_lock:
+            if self._sessions.get(serial) is sock:
+                del self._sessions[serial]
+        sock.close()
+
+    def tap(self, serial, x, y):
+        self.shell_async(serial, f"input tap {int(x)} {int(y)}")
+
+    def close(self):
+        with self._sessions_lock:
+            for sock in self._sessions.values():
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+            self._sessions.clear()
+
+
+@lru_cache(maxsize=1)
+def get_adb_client():
+    """进程内共享的 ADB 客户端"""
+    return AdbClient()
@@ -0,0 +1,113 @@
+import time
+import threading
+from functools import lru_cache
+from metrics import METRICS
+from config import (
+    CAPTURE_INTERVAL, CAPTURE_MIN_INTERVAL, CAPTURE_MAX_INTERVAL, CAPTURE_IDLE_INTERVAL,
+    CAPTURE_LATENCY_TARGET, CAPTURE_HOT_SECONDS, CAPTURE_STATIC_BACKOFF, CAPTURE_CPU_TARGET
+)
+
+# 之后很快会出现结算/掉落画面的状态：提高截图频率
+HOT_SCREENS = frozenset(("skip", "race_result", "item_drop"))
+# 已知会持续较久、没有需要记录内容的状态：降低截图频率
+IDLE_SCREENS = frozenset(("home", "jitaend"))
+
+
+# ========= CPU 预算 =========
+class CpuBudget:
+    """按 CPU 占用（单核比例）给出截图间隔的放大系数，多台设备共享。
+    占用为本进程加上 add_source 登记的其他 CPU 时间来源（多进程识别时的识别进程）；
+    超过 target 时系数逐步变大，低于 target 时逐步回落到 1。
+    """
+
+    def __init__(self, target=CAPTURE_CPU_TARGET, window=1.0, max_scale=8.0):
+        self.target = target
+        self.window = window
+        self.max_scale = max_scale
+        self.scale = 1.0
+        self.usage = 0.0
+        self._lock = threading.Lock()
+        self._sources = [time.process_time]
+        self._wall = time.monotonic()
+        self._cpu = self._cpu_time()
+
+    def _cpu_time(self):
+        return sum(source() for source in self._sources)
+
+    def add_source(self, cpu_time_func):
+        """登记累计 CPU 时间（秒）的来源，如 ProcessRecognizer.cpu_time"""
+        with self._lock:
+            self._sources.append(cpu_time_func)
+            self._wall = time.monotonic()
+            self._cpu = self._cpu_time()
+
+    def update(self):
+        if self.target <= 0:
+            return 1.0
+        now = time.monotonic()
+        with self._lock:
+            if now - self._wall >= self.window:
+                cpu = self._cpu_time()
+                self.usage = (cpu - self._cpu) / (now - self._wall)
+                self._wall, self._cpu = now, cpu
+                ratio = self.usage / self.target
+                # 平滑调整，避免间隔来回震荡
+                self.scale = min(self.max_scale, max(1.0, self.scale * (0.5 + 0.5 * ratio)))
+                METRICS.set_gauge("cpu_usage", round(self.usage, 3))
+            return self.scale
+
+
+@lru_cache(maxsize=1)
+def get_cpu_budget():
+    return CpuBudget()
+
+
+# ========= 自适应截图间隔 =========
+class CapturePacer:
+    """根据识别到的画面状态决定下一次截图的间隔：
+    - 跳过/结算/掉落之后的 hot_seconds 内使用最小间隔，保证不漏掉结算帧；
+    - 主界面等长时间停留的状态使用空闲间隔；
+    - 连续静态帧按 backoff 逐步放慢，但不超过延迟目标；
+    - 非 hot 状态下的间隔再乘以 CPU 预算系数。
+    """
+
+    def __init__(self, min_interval=CAPTURE_MIN_INTERVAL, max_interval=CAPTURE_MAX_INTERVAL,
+                 normal_interval=CAPTURE_INTERVAL, idle_interval=CAPTURE_IDLE_INTERVAL,
+                 latency_target=CAPTURE_LATENCY_TARGET, hot_seconds=CAPTURE_HOT_SECONDS,
+                 backoff=CAPTURE_STATIC_BACKOFF, cpu_budget=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.normal_interval = max(min_interval, normal_interval)
+        self.idle_interval = idle_interval
+        self.latency_target = max(min_interval, latency_target)
+        self.hot_seconds = hot_seconds
+        self.backoff = backoff
+        self.cpu_budget = cpu_budget or get_cpu_budget()
+        self._static_run = 0
+        self._hot_until = 0.0
+        self._seen_screen_at = None
+        self.interval = self.normal_interval
+
+    def next_interval(self, screen, screen_at, static, now=None):
+        """screen / screen_at：最近一次识别出的画面状态及其时间（time.monotonic）
+        static：本次截图是否被判定为静态帧
+        """
+        if now is None:
+            now = time.monotonic()
+        if screen_at != self._seen_screen_at:
+            self._seen_screen_at = screen_at
+            if screen in HOT_SCREENS:
+                self._hot_until = screen_at + self.hot_seconds
+        self._static_run = self._static_run + 1 if static else 0
+
+        if now < self._hot_until:
+            interval = self.min_interval
+        else:
+            scale = self.cpu_budget.update()
+            if screen in IDLE_SCREENS:
+                interval = min(self.max_interval, self.idle_interval * scale)
+            else:
+                interval = self.normal_interval * (self.backoff ** min(self._static_run, 16))
+                interval = min(self.latency_target, interval * scale)
+        self.interval = max(self.min_interval, interval)
+        return self.interval
@@ -0,0 +1,63 @@
+import time
+import cv2
+import numpy as np
+from frames import RawFrame
+from config import (
+    CHANGE_SAMPLE_STEP, CHANGE_DETAIL_REGIONS, CHANGE_PIXEL_TOLERANCE, CHANGE_MAX_STATIC_SECONDS
+)
+
+
+# ========= 静态帧检测 =========
+class FrameChangeDetector:
+    """在灰度转换之前判断画面是否与上一次处理的帧相同。
+    签名 = 全屏按步长粗采样 + 文字区域逐像素采样，只取绿色通道（近似亮度），
+    任一采样点变化超过容差即视为画面变化。
+    """
+
+    def __init__(self, step=CHANGE_SAMPLE_STEP, regions=CHANGE_DETAIL_REGIONS,
+                 tolerance=CHANGE_PIXEL_TOLERANCE, max_static=CHANGE_MAX_STATIC_SECONDS):
+        self.step = step
+        self.regions = tuple(regions)
+        self.tolerance = tolerance
+        self.max_static = max_static
+        self._prev = None
+        self._last_processed = 0.0
+        self.frames = 0
+        self.skipped = 0
+
+    def _signature(self, frame):
+        # RGBA/BGRA/BGR 的第 1 通道都是绿色
+        pixels = frame.pixels if isinstance(frame, RawFrame) else frame
+        parts = [pixels[::self.step, ::self.step, 1]]
+        for x1, y1, x2, y2 in self.regions:
+            parts.append(pixels[y1:y2, x1:x2, 1])
+        return [np.ascontiguousarray(p) for p in parts]
+
+    def is_static(self, frame, now=None):
+        """返回 True 表示与上一帧相同、可以跳过识别"""
+        if now is None:
+            now = time.monotonic()
+        self.frames += 1
+        sig = self._signature(frame)
+        # 与上一次实际处理的帧比较，缓慢渐变也能累积触发
+        if self._prev is not None and now - self._last_processed < self.max_static and self._same(self._prev, sig):
+            self.skipped += 1
+            return True
+        self._prev = sig
+        self._last_processed = now
+        return False
+
+    def _same(self, a, b):
+        for pa, pb in zip(a, b):
+            if pa.shape != pb.shape:
+                return False
+            if cv2.absdiff(pa, pb).max() > self.tolerance:
+                return False
+        return True
+
+    def stats(self):
+        return {"frames": self.frames, "skipped": self.skipped}
+
+    def describe(self):
+        ratio = self.skipped / self.frames if self.frames else 0.0
+        return f"静态帧跳过：{self.skipped}/{self.frames}（{ratio:.1%}）"
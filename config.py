@@ -1,4 +1,4 @@
-from utils import resource_path
+from paths import resource_path
 
 # ========= 模板路径配置 =========
 
@@ -40,17 +40,57 @@ TEMPLATE_RACE_ITEM = resource_path("assets/templates/race_item.png")
 TEMPLATE_OTHER_HOME = resource_path("assets/templates/other_home.png")
 TEMPLATE_OTHER_JINHUI = resource_path("assets/templates/other_jinhui.png")
 
+# 模板包（main.py bundle 生成 .npy + .json），存在且与模板文件一致时启动直接内存映射
+ASSET_BUNDLE = resource_path("assets/templates_bundle")
+
+# 允许缺失的模板（启动时只提示不报错），名称为去掉 TEMPLATE_ 前缀的常量名
+OPTIONAL_TEMPLATES = (
+    "RACE_WINNER",
+    "ITEM_04", "ITEM_05", "ITEM_06", "ITEM_07",
+    "ITEM_08", "ITEM_09", "ITEM_10",
+)
+
 
 # ========= 匹配与识别参数 =========
 MATCH_FINE = 0.99  # 模板匹配阈值
 MATCH_ROUGH = 0.8       # 道具匹配阈值
 
+# 金字塔匹配：先在缩小图上找候选，再回到原图局部精匹配
+PYRAMID_MAX_LEVEL = 2         # 最多缩小 2^n 倍
+PYRAMID_MIN_TEMPLATE = 10     # 缩小后模板最短边不得小于该像素数
+PYRAMID_CANDIDATES = 3        # 粗匹配保留的候选峰值个数
+PYRAMID_COARSE_MARGIN = 0.25  # 粗匹配阈值 = 精匹配阈值 - 该值
+TEMPLATE_SET_CLEAR_WIN = 0.995     # 模板组取最佳标签时，某标签得分达到该值即视为胜出，不再匹配其余模板
+
+# OCR 后端：auto=优先进程内 libtesseract，失败回退 pytesseract；也可指定 tessapi / pytesseract
+OCR_BACKEND = "auto"
+OCR_CACHE_SIZE = 512          # OCR 结果 LRU 缓存条数，0 表示关闭
+OCR_CACHE_PERSIST = True      # 是否将缓存保存到 ocr_cache.json，重启后继续命中
+DIGIT_MIN_CONFIDENCE = 0.9    # 数字字形识别的最低置信度，低于该值时改用 OCR（并用 OCR 结果学习字形）
+DIGIT_MIN_MARGIN = 0.1        # 最佳数字与次佳数字的得分差低于该值时按差额扣减置信度
+DIGIT_SAMPLES_PER_DIGIT = 8   # 每个数字最多保存的字形样本数
+DIGIT_GLYPHS_PERSIST = True   # 是否将学到的字形保存到 digit_glyphs.npz，重启后直接使用
+DIGIT_SAVE_INTERVAL = 60.0    # 新学到的字形最多每隔该秒数写一次文件，其余在退出时写入
+
+# 比赛名词典：OCR 结果吸附到最近的已知名称，距离上限 = 名称长度 // LEXICON_DISTANCE_DIVISOR
+RACE_NAMES_FILE = resource_path("assets/race_names.txt")
+LEXICON_DISTANCE_DIVISOR = 4
+NAME_FINGERPRINT_SIZE = (64, 12)    # 名称区域指纹尺寸（宽, 高）
+# 指纹汉明距离不超过该值视为同一名称：只差一个字的名称相距 14~19 位，这里只接受几乎完全相同的裁剪
+NAME_FINGERPRINT_MAX_BITS = 4
+NAME_FINGERPRINT_CAPACITY = 256     # 指纹库最多条数
+
 # 点击控制：1=匹配成功自动点击中心点，0=不自动点击
 AUTO_CLICK_SKIP = 1
 AUTO_CLICK_YINZI = 1
 AUTO_CLICK_JITAEND = 0
 
 
+# ========= 分辨率参数 =========
+# 以下区域、模板和点击坐标均按该分辨率截取；其他分辨率的截图先缩放到该尺寸再识别，点击坐标按比例映射回设备
+CANONICAL_WIDTH = 720
+CANONICAL_HEIGHT = 1280
+
 # ========= 区域定义 =========
 REGION1 = (20, 500, 110, 550)      # 区域1
 REGION2 = (95, 500, 350, 550)      # 区域2
@@ -71,7 +111,49 @@ ROI_RACE_GEMS = (0,0, 720, 1280)
 
 
 # ========= 时间与去重参数 =========
-CAPTURE_INTERVAL = 0.05  # 截图间隔（秒）
+CAPTURE_INTERVAL = 0.05  # 常规截图间隔（秒）
 TIME_WINDOW = 5         # 去重时间窗口（秒）
+CONSOLE_DUPLICATE_WINDOW = 3  # 控制台同一类型信息不重复输出的时间窗口（秒）
+CAPTURE_MIN_INTERVAL = 0.03    # 即将出现结算/掉落画面时的截图间隔（秒）
+CAPTURE_MAX_INTERVAL = 0.5     # 任何情况下截图间隔的上限（秒）
+CAPTURE_IDLE_INTERVAL = 0.25   # 主界面等长时间停留状态的截图间隔（秒）
+CAPTURE_LATENCY_TARGET = 0.15  # 非空闲状态下画面出现到被截到的最长延迟（秒）
+CAPTURE_HOT_SECONDS = 3.0      # 出现跳过/结算/掉落后保持最小间隔的秒数
+CAPTURE_STATIC_BACKOFF = 1.5   # 连续静态帧时间隔的放大倍数
+# CPU 占用目标（单核比例，含识别进程），超过时放慢截图（结算/掉落前后的高频截图不受影响）。
+# 默认 0 不限制：正常识别本身就会超过 0.5 核，设置过低会在空闲的机器上也放慢截图；
+# 需要给其他程序让出 CPU 时再设置，如 2.0 表示本程序最多占用约两个核
+CAPTURE_CPU_TARGET = 0
 LAST_DIAMOND_TIME = None  # 上次钻石记录时间
-PREV_DIAMOND = None     # 上次钻石数值
\ No newline at end of file
+PREV_DIAMOND = None     # 上次钻石数值
+
+
+# ========= 画面状态参数 =========
+SCREEN_STATE_FALLBACK_SECONDS = 2.0  # 超过该秒数没有匹配到任何画面时回退到完整检查链
+
+
+# ========= 多设备参数 =========
+RECOGNITION_WORKERS = 2  # 多设备共享的识别线程数（不超过设备数）
+RECOGNITION_EXECUTOR = "thread"  # 识别执行方式：thread=识别线程；process=多进程（使用全部核心）
+RECOGNITION_PROCESSES = 0        # 识别进程数，0 表示 CPU 核数 - 1
+RECOGNITION_TASK_TIMEOUT = 15.0  # 单帧识别超过该秒数视为进程卡死并重启
+RECOGNITION_REPORT_INTERVAL = 1.0  # 识别进程向主进程报告 CPU 时间和性能指标的间隔（秒）
+FRAME_RING_SLOTS = 8             # 每台设备共享内存帧环的槽位数（满时覆盖最旧帧）
+
+
+# ========= 静态帧检测参数 =========
+CHANGE_SAMPLE_STEP = 4            # 全屏粗采样步长（像素）
+CHANGE_DETAIL_REGIONS = (REGION1, REGION2, REGION4, ROI_RACE_RESULT)  # 逐像素比较的文字/细节区域
+CHANGE_PIXEL_TOLERANCE = 8        # 采样点灰度差超过该值视为变化
+CHANGE_MAX_STATIC_SECONDS = 1.0   # 静止画面至少每隔该秒数处理一次（便于重试点击）
+
+
+# ========= 性能统计参数 =========
+METRICS_PORT = 0        # /metrics 端口，0 表示不开启
+STATS_FILE = ""         # 定期写入的统计文件，空表示不写
+STATS_INTERVAL = 60     # 统计文件写入间隔（秒）
+STATS_KEEP = 5          # 统计文件保留的历史份数
+
+
+# ========= 日志统计参数 =========
+LOG_STATS_SUFFIX = ".stats.json"  # stats 命令的检查点文件 = 日志路径 + 该后缀
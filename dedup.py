@@ -0,0 +1,43 @@
+import threading
+from collections import deque
+from metrics import METRICS
+
+
+# ========= 限时去重 =========
+class TtlDedup:
+    """按时间窗口去重：key 在 ttl 秒内再次出现时判定为重复。
+    条目按记录顺序放入队列，每次检查时从队首淘汰已过期的条目，
+    插入与检查均摊 O(1)，大小只与窗口内出现过的 key 数有关（长时间运行也不会增长）。
+    """
+
+    def __init__(self, ttl, name="", device=""):
+        self.ttl = ttl
+        self.name = name
+        self.device = device
+        self._last = {}          # key -> 最后记录时间
+        self._order = deque()    # (记录时间, key)，按记录顺序
+        self._lock = threading.Lock()
+
+    def check(self, key, now):
+        """now 为秒数（时间戳）；窗口内已出现过返回 False，否则记录并返回 True"""
+        with self._lock:
+            self._expire(now)
+            last = self._last.get(key)
+            if last is not None and now - last < self.ttl:
+                return False
+            self._last[key] = now
+            self._order.append((now, key))
+            size = len(self._last)
+        METRICS.set_gauge("dedup_entries", size, device=self.device, table=self.name)
+        return True
+
+    def _expire(self, now):
+        order = self._order
+        while order and now - order[0][0] >= self.ttl:
+            stamp, key = order.popleft()
+            # 同一 key 之后又被记录过时，队首这条只是旧记录
+            if self._last.get(key) == stamp:
+                del self._last[key]
+
+    def __len__(self):
+        return len(self._last)
@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from functools import lru_cache
+import cv2
+import numpy as np
+from paths import base_dir_path
+from metrics import METRICS
+from config import (
+    DIGIT_MIN_CONFIDENCE, DIGIT_MIN_MARGIN, DIGIT_SAMPLES_PER_DIGIT, DIGIT_GLYPHS_PERSIST, DIGIT_SAVE_INTERVAL
+)
+
+# 每个字形缩放到的尺寸（宽, 高）
+GLYPH_SIZE = (12, 18)
+# 高度不足最高字形该比例的连通列（逗号、噪点）不当作数字
+MIN_GLYPH_HEIGHT = 0.6
+# 新样本与同一数字已有样本的相似度超过该值时视为重复，不再保存
+DUPLICATE_SCORE = 0.97
+
+
+# ========= 字形切分 =========
+def segment_glyphs(gray):
+    """Otsu 二值化后按列投影切分字形，返回 (n, 字形像素数) 的 float32 矩阵（每行去均值并单位化）"""
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # 前景（文字）占少数：多数像素为 1 时反转
+    if binary.mean() > 0.5:
+        binary = 1 - binary
+    columns = binary.any(axis=0)
+    # 列投影的上升沿/下降沿即各字形的左右边界
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], columns.view(np.int8), [0]))))
+    spans = []
+    for x1, x2 in zip(edges[::2], edges[1::2]):
+        rows = np.flatnonzero(binary[:, x1:x2].any(axis=1))
+        spans.append((x1, x2, rows[0], rows[-1] + 1))
+    if not spans:
+        return np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+    tallest = max(y2 - y1 for _, _, y1, y2 in spans)
+    glyphs = [
+        cv2.resize(binary[y1:y2, x1:x2].astype(np.float32), GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+        for x1, x2, y1, y2 in spans if y2 - y1 >= tallest * MIN_GLYPH_HEIGHT
+    ]
+    return _normalize(np.array(glyphs, np.float32))
+
+
+def _normalize(vectors):
+    vectors = vectors - vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+# ========= 数字识别 =========
+class DigitRecognizer:
+    """游戏数字字体固定：切分字形后与数字样本库一次矩阵乘法比较，得到数字和置信度。
+    样本库从 OCR 的可靠结果中自举（字形数与识别出的位数一致时逐位保存），
+    置信度不足时调用 OCR 并用其结果继续扩充样本库。
+    """
+
+    def __init__(self, path=None, min_confidence=DIGIT_MIN_CONFIDENCE, min_margin=DIGIT_MIN_MARGIN,
+                 samples_per_digit=DIGIT_SAMPLES_PER_DIGIT, save_interval=DIGIT_SAVE_INTERVAL):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.samples_per_digit = samples_per_digit
+        self.save_interval = save_interval
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        # (样本矩阵, 各样本对应的数字)；整体替换，读取时不需要加锁
+        self._bank = (np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32), np.zeros(0, np.int8))
+        self.hits = 0
+        self.fallbacks = 0
+        if path:
+            self.load()
+
+    @property
+    def known_digits(self):
+        return set(self._bank[1].tolist())
+
+    def classify(self, gray):
+        """返回 (数字串, 置信度)；每位的置信度为最佳得分减去与次佳数字差距不足 min_margin 的部分，整体取最小值"""
+        samples, labels = self._bank
+        glyphs = segment_glyphs(gray)
+        if not len(glyphs) or not len(samples):
+            return "", 0.0
+        scores = glyphs @ samples.T
+        # 样本按数字排序保存，每个数字取其样本中的最高分：(字形数, 10)
+        digits, starts = np.unique(labels, return_index=True)
+        per_digit = np.full((len(glyphs), 10), -1.0, np.float32)
+        per_digit[:, digits] = np.maximum.reduceat(scores, starts, axis=1)
+        order = np.argsort(per_digit, axis=1)
+        best = per_digit[np.arange(len(glyphs)), order[:, -1]]
+        second = per_digit[np.arange(len(glyphs)), order[:, -2]]
+        confidence = best - np.maximum(0.0, self.min_margin - (best - second))
+        text = "".join(str(d) for d in order[:, -1])
+        return text, float(confidence.min())
+
+    def read(self, gray, fallback):
+        """置信度足够时直接返回识别结果，否则调用 fallback()（OCR）并用其结果学习"""
+        text, confidence = self.classify(gray)
+        if text and confidence >= self.min_confidence:
+            self.hits += 1
+            METRICS.inc("digit_reads", result="glyph")
+            return text
+        self.fallbacks += 1
+        METRICS.inc("digit_reads", result="ocr")
+        text = fallback()
+        self.learn(gray, text)
+        return text
+
+    def learn(self, gray, text):
+        """text 为该区域的可靠读数（纯数字，允许逗号）；字形数与位数一致时加入新样本。
+        新样本只在内存中标记待保存，每隔 save_interval 秒最多写一次文件，退出时由 save() 写入剩余部分
+        """
+        digits = (text or "").replace(",", "").strip()
+        if not digits.isdigit():
+            return False
+        glyphs = segment_glyphs(gray)
+        if len(glyphs) != len(digits):
+            return False
+        with self._lock:
+            added = self._merge(glyphs, [int(ch) for ch in digits])
+            if not added:
+                return False
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= self.save_interval
+        if due:
+            self.save()
+        return True
+
+    def _merge(self, glyphs, digits):
+        """按样本上限和去重规则把样本并入样本库（调用方持有锁），返回加入的样本数"""
+        samples, labels = self._bank
+        added = 0
+        for glyph, digit in zip(glyphs, digits):
+            same = labels == digit
+            if same.sum() >= self.samples_per_digit:
+                continue
+            scores = samples @ glyph
+            if same.any() and scores[same].max() >= DUPLICATE_SCORE:
+                continue
+            # 与其他数字的样本过于相似时 OCR 结果可能有误，不学习
+            if (~same).any() and scores[~same].max() >= self.min_confidence:
+                continue
+            samples = np.vstack((samples, glyph[None]))
+            labels = np.append(labels, np.int8(digit))
+            added += 1
+        if added:
+            order = np.argsort(labels, kind="stable")
+            self._bank = (samples[order], labels[order])
+        return added
+
+    def _read_file(self):
+        """文件中的 (样本矩阵, 数字)；不存在或无法读取时返回 None"""
+        if not self.path or not os.path.isfile(self.path):
+            return None
+        try:
+            with np.load(self.path) as data:
+                samples, labels = data["samples"].astype(np.float32), data["labels"].astype(np.int8)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"警告：数字字形文件无法读取，已忽略：{e}")
+            return None
+        if samples.ndim != 2 or samples.shape[1] != GLYPH_SIZE[0] * GLYPH_SIZE[1] or len(samples) != len(labels):
+            return None
+        return samples, labels
+
+    def load(self):
+        stored = self._read_file()
+        if stored is not None:
+            order = np.argsort(stored[1], kind="stable")
+            self._bank = (stored[0][order], stored[1][order])
+
+    def save(self):
+        """有新样本时保存：先并入文件中其他进程保存的样本，再经按进程区分的临时文件替换"""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            stored = self._read_file()
+            if stored is not None:
+                self._merge(stored[0], stored[1].tolist())
+            samples, labels = self._bank
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp_path, samples=samples, labels=labels)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"警告：保存数字字形失败：{e}")
+
+    def describe(self):
+        return f"数字识别：字形 {self.hits} 次，OCR {self.fallbacks} 次，已学习数字 {sorted(self.known_digits)}"
+
+
+# 是否读写 digit_glyphs.npz；回放时由 use_private_digit_recognizer 关闭
+_persist_glyphs = DIGIT_GLYPHS_PERSIST
+
+
+@lru_cache(maxsize=1)
+def get_digit_recognizer():
+    """进程内共享的数字识别器"""
+    path = os.path.join(base_dir_path(), "digit_glyphs.npz") if _persist_glyphs else None
+    return DigitRecognizer(path)
+
+
+def use_private_digit_recognizer():
+    """回放/基准使用：之后 get_digit_recognizer() 创建空样本库的识别器，不读写 digit_glyphs.npz"""
+    global _persist_glyphs
+    _persist_glyphs = False
+    get_digit_recognizer.cache_clear()
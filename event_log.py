@@ -0,0 +1,133 @@
+import os
+import threading
+from queue import Queue, Empty
+from metrics import METRICS
+
+LOG_HEADER = "序号,时间,类型,等级,名称,身位,其他\n"
+LOG_COLUMNS = 7
+RACE_TYPE = "比赛"
+# 掉落补充记录：序号指向对应的比赛行，其他列为该比赛累计的全部道具
+DROP_TYPE = "掉落"
+
+
+def format_row(parts):
+    """把各列拼成一行，空值替换为"-" """
+    parts = [part if part is not None and part != "" else "-" for part in parts]
+    return ",".join(parts) + "\n"
+
+
+def parse_row(line):
+    """拆分一行；道具列本身可能含逗号，超出的部分都归入最后一列"""
+    parts = line.rstrip("\r\n").split(",")
+    if len(parts) > LOG_COLUMNS:
+        parts = parts[:LOG_COLUMNS - 1] + [",".join(parts[LOG_COLUMNS - 1:])]
+    return parts
+
+
+# ========= 追加式事件日志 =========
+class EventLog:
+    """log.csv 只追加不重写：普通记录和掉落补充记录都交给后台线程批量写入"""
+
+    def __init__(self, path, flush_interval=0.2, batch_size=256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = Queue()
+        self._closed = threading.Event()
+        self._writer = None
+        self._start_lock = threading.Lock()
+        if not os.path.isfile(path):
+            with open(path, "w", encoding="utf-8-sig") as f:
+                f.write(LOG_HEADER)
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._start_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+                    self._writer.start()
+
+    def append(self, parts):
+        """追加一条记录（parts 为完整的 7 列）"""
+        self._ensure_writer()
+        self._queue.put(format_row(parts))
+
+    def amend_items(self, scount, ts, items_str):
+        """为序号为 scount 的比赛追加掉落补充记录，O(1)，不读取已有内容"""
+        self.append([f"{scount:05d}", ts, DROP_TYPE, "-", "-", "-", items_str])
+
+    def _drain(self, first):
+        lines = [first]
+        while len(lines) < self.batch_size:
+            try:
+                lines.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return lines
+
+    def _write(self, lines):
+        with METRICS.timer("stage", stage="log_write"):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+        METRICS.inc("log_rows", len(lines))
+
+    def _writer_loop(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except Empty:
+                if self._closed.is_set():
+                    return
+                continue
+            try:
+                self._write(self._drain(first))
+            except OSError as e:
+                print(f"错误：写入日志失败：{e}")
+
+    def close(self):
+        """停止后台线程并写完剩余记录"""
+        self._closed.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except Empty:
+                break
+        if remaining:
+            self._write(remaining)
+
+
+# ========= 导出 =========
+def export_csv(src_path, dst_path):
+    """把掉落补充记录合并回对应比赛行，导出为 序号,时间,类型,等级,名称,身位,其他 格式
+    返回导出的行数
+    """
+    rows = []
+    race_index = {}
+    with open(src_path, "r", encoding="utf-8-sig") as f:
+        f.readline()
+        for line in f:
+            if not line.strip():
+                continue
+            parts = parse_row(line)
+            if len(parts) < LOG_COLUMNS:
+                rows.append(parts)
+                continue
+            if parts[2] == DROP_TYPE:
+                idx = race_index.get(parts[0])
+                if idx is not None:
+                    rows[idx][-1] = parts[-1]
+                continue
+            if parts[2] == RACE_TYPE:
+                race_index[parts[0]] = len(rows)
+            rows.append(parts)
+
+    tmp_path = dst_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig") as f:
+        f.write(LOG_HEADER)
+        for parts in rows:
+            f.write(",".join(parts) + "\n")
+    os.replace(tmp_path, dst_path)
+    return len(rows)
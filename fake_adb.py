@@ -0,0 +1,270 @@
+import os
+import re
+import time
+import struct
+import socket
+import argparse
+import threading
+import socketserver
+import cv2
+from adb_client import ADB_SERVER_PORT
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def _natural_key(name):
+    return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', name)]
+
+
+def load_screens(source, size=None):
+    """读取目录中的截图（或单张图片），可缩放到指定分辨率 (w, h)，返回 BGR 图像列表"""
+    if os.path.isdir(source):
+        paths = [os.path.join(source, n) for n in sorted(os.listdir(source), key=_natural_key)
+                 if n.lower().endswith(IMAGE_EXTS)]
+    else:
+        paths = [source]
+    screens = []
+    for path in paths:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        if size and (img.shape[1], img.shape[0]) != tuple(size):
+            img = cv2.resize(img, tuple(size), interpolation=cv2.INTER_AREA)
+        screens.append(img)
+    if not screens:
+        raise FileNotFoundError(f"未找到可用截图：{source}")
+    return screens
+
+
+# ========= 模拟设备 =========
+class FakeDevice:
+    """按脚本播放截图的模拟设备：记录收到的点击，截图可附加固定延迟。
+    frame_seconds > 0 时按时间切换画面，否则每次截图切换到下一张。
+    """
+
+    def __init__(self, serial, screens, latency=0.0, frame_seconds=0.0, loop=True):
+        self.serial = serial
+        self.latency = latency
+        self.frame_seconds = frame_seconds
+        self.loop = loop
+        self.height, self.width = screens[0].shape[:2]
+        # 预先编码，避免模拟端自身成为瓶颈
+        self._png = [cv2.imencode(".png", img)[1].tobytes() for img in screens]
+        header = struct.pack("<IIII", self.width, self.height, 1, 1)
+        self._raw = [header + cv2.cvtColor(img, cv2.COLOR_BGR2RGBA).tobytes() for img in screens]
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._captures = 0
+        self._index = 0
+        self._index_since = self._start
+        self.taps = []  # [(时间, x, y, 当前画面编号, 画面已显示的秒数)]
+
+    def _current_index(self):
+        count = len(self._png)
+        if self.frame_seconds > 0:
+            idx = int((time.monotonic() - self._start) / self.frame_seconds)
+        else:
+            idx = self._captures
+        return idx % count if self.loop else min(idx, count - 1)
+
+    def screencap(self, png):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            idx = self._current_index()
+            if idx != self._index:
+                self._index = idx
+                self._index_since = time.monotonic()
+            self._captures += 1
+        return self._png[idx] if png else self._raw[idx]
+
+    def tap(self, x, y):
+        now = time.monotonic()
+        with self._lock:
+            self.taps.append((now, x, y, self._index, now - self._index_since))
+
+    def run(self, command):
+        """执行一条命令并返回输出字节"""
+        args = command.split()
+        if args[:1] == ["screencap"]:
+            return self.screencap(png="-p" in args)
+        if args[:2] == ["input", "tap"] and len(args) >= 4:
+            self.tap(int(float(args[2])), int(float(args[3])))
+            return b""
+        if args[:2] == ["wm", "size"]:
+            return f"Physical size: {self.width}x{self.height}\n".encode("ascii")
+        return b""
+
+    def stats(self):
+        with self._lock:
+            reaction = [t[4] for t in self.taps]
+            return {
+                "captures": self._captures,
+                "taps": len(self.taps),
+                "reaction_ms_avg": (sum(reaction) / len(reaction) * 1000) if reaction else 0.0,
+            }
+
+
+# ========= smart-socket 服务端 =========
+def _read_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def _read_request(sock):
+    head = _read_exact(sock, 4)
+    if head is None:
+        return None
+    body = _read_exact(sock, int(head, 16))
+    return None if body is None else body.decode("utf-8")
+
+
+def _okay(sock, data=None):
+    if data is None:
+        sock.sendall(b"OKAY")
+    else:
+        sock.sendall(b"OKAY" + b"%04x" % len(data) + data)
+
+
+def _fail(sock, message):
+    data = message.encode("utf-8")
+    sock.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+
+class _AdbHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        devices = self.server.devices
+        device = None
+        while True:
+            req = _read_request(sock)
+            if req is None:
+                return
+            if req == "host:version":
+                _okay(sock, b"0029")
+                return
+            if req in ("host:devices", "host:devices-l"):
+                _okay(sock, "".join(f"{s}\tdevice\n" for s in devices).encode("utf-8"))
+                return
+            if req.startswith("host:transport:"):
+                device = devices.get(req[len("host:transport:"):])
+                if device is None:
+                    _fail(sock, "device not found")
+                    return
+                _okay(sock)
+                continue
+            if req in ("host:transport-any", "host:transport-local"):
+                device = next(iter(devices.values()), None)
+                if device is None:
+                    _fail(sock, "no devices")
+                    return
+                _okay(sock)
+                continue
+            if device is None or not req.startswith(("exec:", "shell:")):
+                _fail(sock, f"unsupported service: {req}")
+                return
+            command = req.split(":", 1)[1].strip()
+            _okay(sock)
+            if command in ("", "sh"):
+                self._session(sock, device)
+            else:
+                sock.sendall(device.run(command))
+            return
+
+    def _session(self, sock, device):
+        """常驻 shell 会话：逐行执行收到的命令"""
+        with self.server.sessions_lock:
+            self.server.sessions.add(sock)
+        try:
+            self._session_loop(sock, device)
+        finally:
+            with self.server.sessions_lock:
+                self.server.sessions.discard(sock)
+
+    def _session_loop(self, sock, device):
+        buf = b""
+        while True:
+            try:
+                chunk = sock.recv(4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buf += chunk
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                out = device.run(line.decode("utf-8", "replace").strip())
+                if out:
+                    sock.sendall(out)
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """本地模拟 adb server，可同时挂载多台 FakeDevice"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, devices, host="127.0.0.1", port=ADB_SERVER_PORT):
+        self.devices = {d.serial: d for d in devices}
+        self.sessions = set()
+        self.sessions_lock = threading.Lock()
+        super().__init__((host, port), _AdbHandler)
+
+    def drop_sessions(self):
+        """关闭所有常驻 shell 会话（模拟设备重启或 adb server 断开会话）"""
+        with self.sessions_lock:
+            sessions = list(self.sessions)
+        for sock in sessions:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def start(self):
+        t = threading.Thread(target=self.serve_forever, name="fake-adb", daemon=True)
+        t.start()
+        return t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 adb server，用于压测截图/识别/点击链路")
+    parser.add_argument("screens", help="截图目录或单张图片，按文件名顺序播放")
+    parser.add_argument("--devices", "-n", type=int, default=1, help="模拟设备数量")
+    parser.add_argument("--port", type=int, default=ADB_SERVER_PORT, help="监听端口")
+    parser.add_argument("--size", help="输出分辨率，如 1080x1920（默认保持原图）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次截图附加延迟（秒）")
+    parser.add_argument("--frame-seconds", type=float, default=0.0,
+                        help="每张画面持续的秒数；0 表示每次截图切换下一张")
+    parser.add_argument("--duration", type=float, default=0.0, help="运行秒数，0 表示直到 Ctrl+C")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x")) if args.size else None
+    screens = load_screens(args.screens, size)
+    devices = [FakeDevice(f"emulator-{5554 + 2 * i}", screens, args.latency, args.frame_seconds)
+               for i in range(args.devices)]
+    server = FakeAdbServer(devices, port=args.port)
+    server.start()
+    print(f"模拟 adb server 已启动：127.0.0.1:{args.port}，设备：{', '.join(d.serial for d in devices)}")
+
+    try:
+        if args.duration > 0:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        for d in devices:
+            s = d.stats()
+            print(f"{d.serial}：截图 {s['captures']} 次，点击 {s['taps']} 次，"
+                  f"平均反应时间 {s['reaction_ms_avg']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import struct
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from frames import RawFrame
+
+# 每个槽位的头部：序号、高、宽、通道数、像素格式
+_HEADER = struct.Struct("<qIIII")
+HEADER_SIZE = 32
+KIND_BGR = 0
+KIND_RGBA = 1
+KIND_BGRA = 2
+
+
+# ========= 共享内存帧环 =========
+class FrameRing:
+    """固定槽位数的共享内存帧缓冲：写入总是成功，槽位满时覆盖最旧的帧。
+    每帧有递增序号，读取返回 numpy 视图（不拷贝）；读取方在用完后调用 valid(seq)
+    确认该帧期间未被覆盖（类似 seqlock），被覆盖的帧结果应丢弃。
+    内存占用固定为 slots × (头部 + slot_bytes)，与读取方快慢无关。
+    """
+
+    def __init__(self, slots, slot_bytes, name=None, start_seq=0):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.stride = HEADER_SIZE + slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * self.stride)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._seq = start_seq
+        self._lock = threading.Lock()
+
+    @classmethod
+    def attach(cls, spec):
+        """按 spec（name, slots, slot_bytes）在其他进程中打开同一帧环"""
+        name, slots, slot_bytes = spec
+        return cls(slots, slot_bytes, name=name)
+
+    @property
+    def spec(self):
+        return (self.shm.name, self.slots, self.slot_bytes)
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def fits(self, frame):
+        return frame_nbytes(frame) <= self.slot_bytes
+
+    def put(self, frame):
+        """写入一帧（BGR ndarray 或 RawFrame），返回其序号"""
+        pixels, kind = _pixels(frame)
+        if pixels.nbytes > self.slot_bytes:
+            raise ValueError(f"帧大小 {pixels.nbytes} 超过槽位大小 {self.slot_bytes}")
+        h, w = pixels.shape[:2]
+        channels = pixels.shape[2] if pixels.ndim == 3 else 1
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            offset = (seq % self.slots) * self.stride
+            buf = self.shm.buf
+            # 先作废槽位再写像素，读取方不会把写了一半的帧当成有效帧
+            _HEADER.pack_into(buf, offset, 0, 0, 0, 0, 0)
+            dst = np.ndarray(pixels.shape, np.uint8, buffer=buf, offset=offset + HEADER_SIZE)
+            np.copyto(dst, pixels)
+            _HEADER.pack_into(buf, offset, seq, h, w, channels, kind)
+        return seq
+
+    def get(self, seq):
+        """返回序号为 seq 的帧视图；已被覆盖或不存在时返回 None"""
+        offset = (seq % self.slots) * self.stride
+        stored, h, w, channels, kind = _HEADER.unpack_from(self.shm.buf, offset)
+        if stored != seq:
+            return None
+        shape = (h, w, channels) if channels > 1 else (h, w)
+        view = np.ndarray(shape, np.uint8, buffer=self.shm.buf, offset=offset + HEADER_SIZE)
+        if kind == KIND_BGR:
+            return view
+        return RawFrame(view, bgra=(kind == KIND_BGRA))
+
+    def valid(self, seq):
+        """seq 对应的帧是否仍在槽位中"""
+        return _HEADER.unpack_from(self.shm.buf, (seq % self.slots) * self.stride)[0] == seq
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有视图引用共享内存时由进程退出回收
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def frame_nbytes(frame):
+    """帧（BGR ndarray 或 RawFrame）写入帧环所需的字节数"""
+    return _pixels(frame)[0].nbytes
+
+
+def _pixels(frame):
+    if isinstance(frame, RawFrame):
+        return frame.pixels, (KIND_BGRA if frame.bgra else KIND_RGBA)
+    return frame, KIND_BGR
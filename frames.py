@@ -0,0 +1,158 @@
+import struct
+import cv2
+import numpy as np
+
+# screencap 原始格式（android PixelFormat）
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_BGRA_8888 = 5
+
+
+# ========= 原始帧 =========
+class RawFrame:
+    """screencap 原始帧的零拷贝视图：像素数据仍是 adb 返回的字节串，
+    只有逻辑实际读取的区域才转换为灰度或 BGR。
+    """
+    __slots__ = ("pixels", "bgra")
+
+    def __init__(self, pixels, bgra=False):
+        self.pixels = pixels  # (h, w, 4) uint8，只读视图
+        self.bgra = bgra
+
+    @property
+    def shape(self):
+        h, w = self.pixels.shape[:2]
+        return (h, w, 3)
+
+    def _crop(self, region):
+        if region is None:
+            return self.pixels
+        x1, y1, x2, y2 = region
+        return self.pixels[y1:y2, x1:x2]
+
+    def gray(self, region=None):
+        code = cv2.COLOR_BGRA2GRAY if self.bgra else cv2.COLOR_RGBA2GRAY
+        return cv2.cvtColor(self._crop(region), code)
+
+    def bgr(self, region=None):
+        code = cv2.COLOR_BGRA2BGR if self.bgra else cv2.COLOR_RGBA2BGR
+        return cv2.cvtColor(self._crop(region), code)
+
+
+def parse_raw_screencap(data):
+    """解析 `screencap`（不带 -p）的输出：宽、高、格式（新系统另有色彩空间字段）+ 像素数据。
+    返回 RawFrame；格式不支持或数据长度不符时返回 None。
+    """
+    if len(data) < 12:
+        return None
+    width, height, fmt = struct.unpack_from("<III", data, 0)
+    payload = width * height * 4
+    if fmt not in (PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888, PIXEL_FORMAT_BGRA_8888) or payload == 0:
+        return None
+    # Android 9 起头部多出 4 字节色彩空间字段
+    for header in (16, 12):
+        if len(data) == header + payload:
+            pixels = np.frombuffer(data, np.uint8, count=payload, offset=header)
+            return RawFrame(pixels.reshape(height, width, 4), bgra=(fmt == PIXEL_FORMAT_BGRA_8888))
+    return None
+
+
+# ========= 按需裁剪 =========
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+class FrameCrops:
+    """单帧的按需裁剪缓存：只转换实际读取的区域。
+    regions 为各检查声明会读取的区域：落在声明区域内的读取先把整个声明区域转换一次，
+    同一区域的多个模板、多个检查共享该裁剪；其他区域只转换自身。
+    已生成整帧灰度图（整图匹配需要）时，区域读取直接从中切片，不再转换。
+    """
+    __slots__ = ("frame", "regions", "_gray", "_bgr", "_scaled", "converted")
+
+    def __init__(self, frame, regions=(), gray=None):
+        self.frame = frame
+        self.regions = tuple(regions)
+        self._gray = {None: gray} if gray is not None else {}
+        self._bgr = {}
+        self._scaled = {}
+        self.converted = 0  # 实际做过颜色转换的像素数
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    def _lookup(self, cache, region):
+        if region in cache:
+            return cache[region]
+        # 已有包含该区域的裁剪（或整帧）时直接切片，不再转换
+        for key, img in cache.items():
+            if key is None:
+                x1, y1, x2, y2 = region
+                return img[y1:y2, x1:x2]
+            if _contains(key, region):
+                x1, y1, x2, y2 = region
+                return img[y1 - key[1]:y2 - key[1], x1 - key[0]:x2 - key[0]]
+        return None
+
+    def _source_region(self, region):
+        for declared in self.regions:
+            if _contains(declared, region):
+                return declared
+        return region
+
+    def gray(self, region=None):
+        """区域 (x1,y1,x2,y2) 的灰度图；region 为 None 时返回整帧灰度图"""
+        if region is not None:
+            region = tuple(region)
+        img = self._lookup(self._gray, region) if region is not None else self._gray.get(None)
+        if img is not None:
+            return img
+        source = self._source_region(region) if region is not None else None
+        img = frame_gray(self.frame, source)
+        self.converted += img.shape[0] * img.shape[1]
+        self._gray[source] = img
+        return img if source == region else self._lookup(self._gray, region)
+
+    def bgr(self, region):
+        """区域的 BGR 图像（只用于 OCR 等小区域，不按声明区域扩大）"""
+        region = tuple(region)
+        img = self._lookup(self._bgr, region)
+        if img is None:
+            img = self._bgr[region] = crop_bgr(self.frame, region)
+        return img
+
+    def scaled_gray(self, scale):
+        """缩小 scale 倍的整帧灰度图（金字塔粗匹配用）。
+        实测先整帧转灰度再缩放比直接缩放彩色帧更快，因此这里会生成并缓存整帧灰度图。
+        """
+        img = self._scaled.get(scale)
+        if img is None:
+            full = self.gray()
+            h, w = full.shape[:2]
+            img = cv2.resize(full, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+            self._scaled[scale] = img
+        return img
+
+
+# ========= 统一访问接口 =========
+def frame_gray(frame, region=None):
+    """返回帧（BGR ndarray、RawFrame 或 FrameCrops）的灰度图或其区域"""
+    if isinstance(frame, FrameCrops):
+        return frame.gray(region)
+    if isinstance(frame, RawFrame):
+        return frame.gray(region)
+    if region is not None:
+        x1, y1, x2, y2 = region
+        frame = frame[y1:y2, x1:x2]
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def crop_bgr(frame, region):
+    """返回帧（BGR ndarray、RawFrame 或 FrameCrops）指定区域的 BGR 图像"""
+    if isinstance(frame, FrameCrops):
+        return frame.bgr(region)
+    if isinstance(frame, RawFrame):
+        return frame.bgr(region)
+    x1, y1, x2, y2 = region
+    return frame[y1:y2, x1:x2]
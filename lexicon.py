@@ -0,0 +1,192 @@
+import os
+import threading
+from functools import lru_cache
+import cv2
+import numpy as np
+from config import (
+    RACE_NAMES_FILE, LEXICON_DISTANCE_DIVISOR, NAME_FINGERPRINT_SIZE,
+    NAME_FINGERPRINT_MAX_BITS, NAME_FINGERPRINT_CAPACITY
+)
+
+# OCR 常见的全角/半角差异统一后再比较
+_NORMALIZE = str.maketrans({"（": "(", "）": ")", "・": "·", " ": None, "　": None})
+
+
+def normalize_name(text):
+    return (text or "").strip().translate(_NORMALIZE)
+
+
+def edit_distance(a, b):
+    """Levenshtein 距离（名称很短，纯 Python 足够）"""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+# ========= BK 树 =========
+class BKTree:
+    """按编辑距离组织的 BK 树，查询时利用三角不等式剪枝"""
+
+    def __init__(self, words=()):
+        self._root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            d = edit_distance(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """返回 [(distance, word), ...]，按距离升序"""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_word, children = stack.pop()
+            d = edit_distance(word, node_word)
+            if d <= max_distance:
+                found.append((d, node_word))
+            for dist, child in children.items():
+                if d - max_distance <= dist <= d + max_distance:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+# ========= 比赛名词典 =========
+class RaceLexicon:
+    """已知比赛名称集合；把 OCR 结果吸附到距离上限内唯一最近的名称"""
+
+    def __init__(self, names):
+        self.names = {normalize_name(n) for n in names if normalize_name(n)}
+        self._tree = BKTree(sorted(self.names))
+
+    @classmethod
+    def from_file(cls, path=RACE_NAMES_FILE):
+        if not os.path.isfile(path):
+            return cls([])
+        with open(path, "r", encoding="utf-8") as f:
+            names = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+        return cls(names)
+
+    def max_distance(self, text):
+        return len(text) // LEXICON_DISTANCE_DIVISOR
+
+    def snap(self, text):
+        """返回 (名称, 距离)；无法吸附时返回 (原文本, None)"""
+        text = normalize_name(text)
+        if not text:
+            return text, None
+        if text in self.names:
+            return text, 0
+        matches = self._tree.search(text, self.max_distance(text))
+        if not matches:
+            return text, None
+        # 最近距离不唯一时不做吸附，避免误改
+        if len(matches) > 1 and matches[0][0] == matches[1][0]:
+            return text, None
+        return matches[0][1], matches[0][0]
+
+    def has_neighbour(self, name):
+        """词典中是否有与 name 编辑距离为 1 的其他名称（如 天皇奖(春)/天皇奖(秋)、URA预赛/URA决赛）"""
+        return any(d == 1 for d, _ in self._tree.search(normalize_name(name), 1))
+
+
+# ========= 名称区域视觉指纹 =========
+def name_fingerprint(crop_bgr):
+    """缩放到固定尺寸后按均值二值化并按位打包"""
+    gray = crop_bgr if crop_bgr.ndim == 2 else cv2.cvtColor(crop_bgr, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, NAME_FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+    return np.packbits(small > small.mean())
+
+
+class NameFingerprints:
+    """已确认名称的指纹库：汉明距离足够小的裁剪直接返回名称，跳过 OCR"""
+
+    def __init__(self, capacity=NAME_FINGERPRINT_CAPACITY, max_bits=NAME_FINGERPRINT_MAX_BITS):
+        self.capacity = capacity
+        self.max_bits = max_bits
+        self._prints = None
+        self._names = []
+        self._lock = threading.Lock()
+
+    def lookup(self, fingerprint):
+        with self._lock:
+            if self._prints is None:
+                return None
+            dist = np.unpackbits(self._prints ^ fingerprint, axis=1).sum(axis=1)
+            best = int(dist.argmin())
+            if dist[best] <= self.max_bits:
+                return self._names[best]
+        return None
+
+    def add(self, fingerprint, name):
+        with self._lock:
+            if self._prints is None:
+                self._prints = fingerprint[None, :]
+            elif len(self._names) < self.capacity:
+                self._prints = np.vstack([self._prints, fingerprint])
+            else:
+                return
+            self._names.append(name)
+
+    def __len__(self):
+        return len(self._names)
+
+
+# ========= 比赛名识别 =========
+class RaceNameRecognizer:
+    """指纹命中则不做 OCR；否则 OCR 后吸附到词典，精确命中的裁剪登记指纹。
+    只差一个字的名称指纹也很接近，词典中有编辑距离为 1 的近邻的名称不登记指纹，每次都做 OCR。
+    """
+
+    def __init__(self, lexicon, fingerprints=None):
+        self.lexicon = lexicon
+        self.fingerprints = fingerprints if fingerprints is not None else NameFingerprints()
+        self.fingerprint_hits = 0
+        self.snapped = 0
+
+    def recognize(self, crop_bgr, ocr):
+        """crop_bgr：名称区域；ocr：无参可调用对象，返回 OCR 文本"""
+        fp = name_fingerprint(crop_bgr)
+        name = self.fingerprints.lookup(fp)
+        if name is not None:
+            self.fingerprint_hits += 1
+            return name
+        name, distance = self.lexicon.snap(ocr())
+        if distance is None:
+            return name
+        if distance > 0:
+            self.snapped += 1
+        elif name and not self.lexicon.has_neighbour(name):
+            self.fingerprints.add(fp, name)
+        return name
+
+
+@lru_cache(maxsize=1)
+def get_race_name_recognizer():
+    """进程内共享的比赛名识别器（词典只加载一次）"""
+    return RaceNameRecognizer(RaceLexicon.from_file())
+
+
+def use_private_race_name_recognizer():
+    """回放/基准使用：之后 get_race_name_recognizer() 创建指纹库为空的新识别器"""
+    get_race_name_recognizer.cache_clear()
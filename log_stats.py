@@ -0,0 +1,179 @@
+import os
+import re
+import json
+from datetime import datetime
+from event_log import parse_row, LOG_COLUMNS, RACE_TYPE, DROP_TYPE
+
+# 统计口径变化时递增，旧检查点会被丢弃并从头重建
+STATS_VERSION = 2
+# 检查点记录偏移前的若干字节，用来确认日志没有被替换或截断
+TAIL_BYTES = 64
+DIAMOND_GAIN_RE = re.compile(r"增加：(-?\d+)")
+BIG_GAP = "大差距"
+LOSS = "失败"
+
+
+def _counter():
+    return {"runs": 0, "wins": 0, "big": 0, "drops": {}}
+
+
+def _new_stats():
+    return {
+        "version": STATS_VERSION,
+        "offset": 0,
+        "tail": "",
+        "rows": 0,
+        "races": {},
+        "levels": {},
+        "days": {},
+        # 最近一场比赛：掉落补充记录是该比赛的累计道具，只统计新增的部分
+        "last_race": None,
+    }
+
+
+# ========= 增量统计 =========
+class LogStats:
+    """log.csv 的增量统计：检查点保存已读取的字节偏移和按比赛/等级/日期预聚合的计数。
+    每次只读取偏移之后追加的完整行；报告只读聚合结果，与日志长度无关。
+    日志被截断或替换（偏移前的字节不一致）时从头重建。
+    """
+
+    def __init__(self, log_file, stats_file):
+        self.log_file = log_file
+        self.stats_file = stats_file
+        self.stats = self._load()
+
+    def _load(self):
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            return _new_stats()
+        if stats.get("version") != STATS_VERSION:
+            return _new_stats()
+        return stats
+
+    def _checkpoint_valid(self, f):
+        offset = self.stats["offset"]
+        f.seek(0, os.SEEK_END)
+        if f.tell() < offset:
+            return False
+        start = max(0, offset - TAIL_BYTES)
+        f.seek(start)
+        return f.read(offset - start).hex() == self.stats["tail"]
+
+    def update(self):
+        """读取新追加的行并更新聚合，返回本次处理的行数"""
+        with open(self.log_file, "rb") as f:
+            if not self._checkpoint_valid(f):
+                print("提示：日志与统计检查点不一致，重新统计")
+                self.stats = _new_stats()
+            offset = self.stats["offset"]
+            f.seek(offset)
+            data = f.read()
+            # 只处理完整的行，写了一半的行留到下次
+            end = data.rfind(b"\n") + 1
+            data = data[:end]
+            start = max(0, offset + end - TAIL_BYTES)
+            f.seek(start)
+            tail = f.read(offset + end - start)
+
+        lines = data.decode("utf-8-sig" if offset == 0 else "utf-8", errors="replace").splitlines()
+        if offset == 0 and lines:
+            lines = lines[1:]  # 表头
+        count = 0
+        for line in lines:
+            if line.strip():
+                self._add(parse_row(line))
+                count += 1
+        self.stats["offset"] = offset + end
+        self.stats["tail"] = tail.hex()
+        self.stats["rows"] += count
+        return count
+
+    def _add(self, parts):
+        if len(parts) < LOG_COLUMNS:
+            return
+        scount, ts, kind, level, name, position, other = parts
+        day_key = ts[:10]
+        day = self.stats["days"].setdefault(day_key, {"races": _counter(), "diamonds": 0,
+                                                      "first": ts, "last": ts})
+        day["first"] = min(day["first"], ts)
+        day["last"] = max(day["last"], ts)
+        if kind == RACE_TYPE:
+            for counter in (self.stats["levels"].setdefault(level, _counter()),
+                            self.stats["races"].setdefault(name, _counter()),
+                            day["races"]):
+                counter["runs"] += 1
+                counter["wins"] += position != LOSS
+                counter["big"] += position == BIG_GAP
+            self.stats["last_race"] = {"scount": scount, "level": level, "name": name,
+                                       "day": day_key, "items": []}
+            # 旧格式日志和 export 的输出把掉落直接写在比赛行的其他列
+            self._add_drops(scount, other)
+        elif kind == DROP_TYPE:
+            self._add_drops(scount, other)
+        else:
+            m = DIAMOND_GAIN_RE.search(other)
+            if m:
+                day["diamonds"] += int(m.group(1))
+
+    def _add_drops(self, scount, items_str):
+        race = self.stats["last_race"]
+        if race is None or race["scount"] != scount:
+            # 找不到对应的比赛行（日志被手工编辑等），不计入
+            return
+        items = [item for item in items_str.split(",") if item and item != "-"]
+        new_items = [item for item in items if item not in race["items"]]
+        race["items"].extend(new_items)
+        day = self.stats["days"].get(race["day"])
+        for counter in (self.stats["levels"].get(race["level"]), self.stats["races"].get(race["name"]),
+                        day["races"] if day else None):
+            if counter is None:
+                continue
+            for item in new_items:
+                counter["drops"][item] = counter["drops"].get(item, 0) + 1
+
+    def save(self):
+        tmp_path = self.stats_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stats, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.stats_file)
+
+    def report(self):
+        """按等级、比赛、日期输出胜率、大差距比例、掉落率和钻石收入"""
+        lines = [f"共 {self.stats['rows']} 条记录"]
+        lines.append("按等级：")
+        for level, c in sorted(self.stats["levels"].items()):
+            lines.append(f"  {level:<4} {_describe(c)}")
+        lines.append("按比赛：")
+        for name, c in sorted(self.stats["races"].items(), key=lambda kv: -kv[1]["runs"]):
+            lines.append(f"  {name} {_describe(c)}")
+        lines.append("按日期：")
+        for day_key, day in sorted(self.stats["days"].items()):
+            line = f"  {day_key} {_describe(day['races'])}"
+            if day["diamonds"]:
+                hours = _hours_between(day["first"], day["last"])
+                rate = f"，{day['diamonds'] / hours:.0f}/小时" if hours > 0 else ""
+                line += f"，钻石 +{day['diamonds']}{rate}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def _describe(c):
+    runs = c["runs"]
+    if not runs:
+        return "0 场"
+    text = f"{runs} 场，胜率 {c['wins'] / runs:.1%}，大差距 {c['big'] / runs:.1%}"
+    if c["drops"]:
+        drops = "，".join(f"{item} {n / runs:.1%}" for item, n in sorted(c["drops"].items()))
+        text += f"，掉落 {drops}"
+    return text
+
+
+def _hours_between(first, last):
+    fmt = "%Y-%m-%d %H:%M:%S"
+    try:
+        return (datetime.strptime(last, fmt) - datetime.strptime(first, fmt)).total_seconds() / 3600
+    except ValueError:
+        return 0
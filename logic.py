@@ -1,26 +1,50 @@
-import cv2
 import time
 from datetime import datetime, timedelta
-from vision import *
-from utils import adb_tap, base_dir_path
+from utils import adb_tap
+from paths import default_log_path
+from templates import get_template_bank
+from change_detect import FrameChangeDetector
+from screen_state import ScreenStateTracker
+from recognition import recognize_frame
+from frame_ring import FrameRing, frame_nbytes
+from event_log import EventLog
+from actions import ActionQueue
+from dedup import TtlDedup
+from resolution import ResolutionProfile
+from metrics import METRICS
 from config import *
-import config as config_module
-import os
-import pytesseract
 import re
 import threading
 from queue import Queue, Empty
 
 # 改为CSV日志路径
-log_path = os.path.join(base_dir_path(), "log.csv")
+log_path = default_log_path()
 
-# 控制台输出去重缓存：key->最后输出时间
-console_last_output = {}
-CONSOLE_DUPLICATE_WINDOW = 3  # 3秒内不重复输出同一类型
+
+# 育成结束后依次点击的位置：(等待秒数, x, y)，在识别到的按钮之后执行
+JITAEND_STEPS = ((1, 520, 1070), (1, 700, 40), (1, 700, 40), (1, 490, 180), (5, 360, 1210))
 
 class RaceRecorder:
-    def __init__(self, device_id):
+    def __init__(self, device_id, log_file=None, scheduler=None, console_prefix="",
+                 tap_func=None, sleep_func=None, executor=None):
+        """log_file：该设备的日志路径（默认 log.csv）
+        scheduler：多设备时共享的 FairScheduler，为 None 时使用自带的识别线程
+        tap_func / sleep_func：点击与等待的实现，离线回放时替换为记录函数；
+                  未提供 sleep_func 时点击和宏在设备的动作线程中异步执行，不阻塞识别
+        executor：多进程识别执行器（recognition.ProcessRecognizer），为 None 时在识别线程内识别；
+                  设置后 scheduler/自带线程只负责按帧序号应用识别结果
+        """
         self.device_id = device_id
+        self._tap = tap_func or (lambda x, y: adb_tap(self.device_id, x, y))
+        # 截图尺寸在首帧时确定；识别在标准分辨率下进行，点击时再换算回设备坐标
+        self.resolution = None
+        self.actions = ActionQueue(lambda x, y: self._tap(*self._to_device(x, y)), sleep_func,
+                                   device=device_id)
+        self.scheduler = scheduler
+        self.executor = executor
+        self.console_prefix = console_prefix
+        # 启动时一次性加载全部模板（缺失必需模板时直接抛错）
+        self.templates = get_template_bank()
         self.last_record_time = None
         self.screenshot_count = 1
         self.prev_diamond = None
@@ -33,9 +57,15 @@ class RaceRecorder:
             "position": None,
             "timestamp": None
         }
-        # 用于去重的最近日志时间字典：key -> datetime
-        self.last_logs = {}
+        # 日志去重（按帧时间，TIME_WINDOW 内同一 key 只写一次）与控制台输出去重（按当前时间）
+        self.log_dedup = TtlDedup(TIME_WINDOW, name="log", device=device_id)
+        self.console_dedup = TtlDedup(CONSOLE_DUPLICATE_WINDOW, name="console", device=device_id)
         self.next_slow_time = None
+        # 最近一次识别出的画面状态及时间（time.monotonic），供自适应截图间隔使用
+        self.last_screen = None
+        self.last_screen_at = None
+        # 首帧识别完成的时间（time.perf_counter），用于统计启动耗时
+        self.first_recognized_at = None
 
         # 新增：缓存上一个比赛日志的信息（用于追加道具）
         self.last_race_log = {
@@ -47,284 +77,303 @@ class RaceRecorder:
             "items": []  # 存储该比赛对应的掉落道具
         }
 
-        # 线程与队列，用于异步处理截图识别
-        self.frame_queue = Queue(maxsize=8)
+        # 静态画面检测：与上一处理帧相同的截图不再转换和入队
+        self.change_detector = FrameChangeDetector()
+        # 画面状态：只检查从当前画面可能出现的模板，超时回退完整检查链
+        self.screen_state = ScreenStateTracker()
+        self._appliers = {
+            "item_drop": self._apply_item_drop,
+            "race_result": self._apply_race_result,
+            "home": self._apply_home,
+            "jinhui": self._apply_jinhui,
+            "skip": self._apply_skip,
+            "jitaend": self._apply_jitaend,
+        }
+
+        # 截图写入共享内存帧环（槽位满时覆盖最旧帧），队列里只放帧序号，内存占用固定
+        self.frame_ring = None
+        # 线程与队列，用于异步处理截图识别（多进程模式下存放按序待应用的识别结果，不丢弃）
+        self.frame_queue = Queue(maxsize=0 if executor is not None else FRAME_RING_SLOTS)
+        # 多进程模式：帧序号 -> 捕获时间；乱序返回的结果按序号重排后再应用
+        self._seq_lock = threading.Lock()
+        self._next_seq = 0
+        self._apply_seq = 0
+        self._submitted = {}
+        self._results = {}
         self.stop_event = threading.Event()
         self.worker_thread = None
-        # 保护 last_logs 和 last_record 的并发访问
+        # 保护 last_record 和 screenshot_count 的并发访问
         self._lock = threading.Lock()
         # 保护 last_race_log 的并发访问
         self._race_log_lock = threading.Lock()
 
-        # 初始化CSV日志文件
-        if not os.path.isfile(log_path):
-            with open(log_path, "w", encoding="utf-8-sig") as f:
-                # 写入CSV表头
-                f.write("序号,时间,类型,等级,名称,身位,其他\n")
+        # CSV日志：只追加，后台线程批量写入
+        self.event_log = EventLog(log_file or log_path)
 
     def _console_output_duplicate_check(self, key, message):
-        """控制台输出去重：3秒内不重复显示同一类型信息"""
-        now = datetime.now()
-        with self._lock:
-            last_time = console_last_output.get(key)
-            if last_time and (now - last_time).total_seconds() < CONSOLE_DUPLICATE_WINDOW:
-                return False
-            console_last_output[key] = now
-        print(message)
+        """控制台输出去重：CONSOLE_DUPLICATE_WINDOW 秒内不重复显示同一类型信息"""
+        if not self.console_dedup.check(key, time.time()):
+            return False
+        print(self.console_prefix + message)
         return True
 
-    def process_frame(self, screen_bgr):
-        # 快速转换并入队，主线程尽量不阻塞
-        gray = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2GRAY)
-        now_dt = datetime.now()
+    def process_frame(self, screen_bgr, now_dt=None):
+        """screen_bgr 可以是 BGR 图像，也可以是原始截图的 RawFrame
+        now_dt：帧的捕获时间，默认取当前时间（离线回放时传入原始时间）
+        返回 False 表示静态帧已跳过
+        """
+        if now_dt is None:
+            now_dt = datetime.now()
+        screen_bgr = self._normalize(screen_bgr)
+        # 画面未变化时直接跳过（计入 change_detector.skipped）
+        if self.change_detector.is_static(screen_bgr, now=now_dt.timestamp()):
+            METRICS.inc("frames", device=self.device_id, result="static")
+            return False
+        with METRICS.timer("stage", stage="ring_put", device=self.device_id):
+            ring = self._ring_for(screen_bgr)
+            ring_seq = ring.put(screen_bgr)
+        if self.executor is not None:
+            self._submit(ring, ring_seq, now_dt)
+            return True
+        METRICS.inc("frames", device=self.device_id, result="processed")
         scount = self.screenshot_count
 
-        # lazy start worker
-        if self.worker_thread is None:
-            self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
-            self.worker_thread.start()
+        self._ensure_worker()
 
         try:
             # 若队列已满，丢弃最旧的一帧以保证最新帧能入队
             if self.frame_queue.full():
                 try:
                     self.frame_queue.get_nowait()
+                    METRICS.inc("frames", device=self.device_id, result="dropped")
                 except Exception:
                     pass
-            self.frame_queue.put_nowait((screen_bgr, gray, now_dt, scount))
+            self.frame_queue.put_nowait((ring_seq, now_dt, scount, None))
+            METRICS.set_gauge("frame_queue_depth", self.frame_queue.qsize(), device=self.device_id)
+            if self.scheduler is not None:
+                self.scheduler.notify(self)
         except Exception:
             # 入队失败时直接进行同步处理以避免丢帧过多
-            self._match_template_and_ocr(screen_bgr, gray, now_dt=now_dt, scount=scount)
-
-    def _should_write(self, key, now_dt):
-        """判断给定 key 的日志是否需要写入（基于 TIME_WINDOW 去重）"""
-        last = self.last_logs.get(key)
-        if last and (now_dt - last).total_seconds() < TIME_WINDOW:
-            return False
+            self._match_template_and_ocr(screen_bgr, None, now_dt=now_dt, scount=scount)
         return True
 
+    def _normalize(self, frame):
+        """缩放到标准分辨率；首帧（或截图尺寸变化时）确定设备分辨率"""
+        profile = self.resolution
+        if profile is None or not profile.matches(frame):
+            profile = ResolutionProfile.for_frame(frame)
+            self.resolution = profile
+            if not profile.identity:
+                print(self.console_prefix + "提示：" + profile.describe())
+            if profile.aspect_mismatch:
+                print(self.console_prefix + f"警告：截图宽高比与 {CANONICAL_WIDTH}x{CANONICAL_HEIGHT} 不同，识别区域可能偏移")
+        if profile.identity:
+            return frame
+        with METRICS.timer("stage", stage="resize", device=self.device_id):
+            return profile.normalize(frame)
+
+    def _to_device(self, x, y):
+        return self.resolution.to_device(x, y) if self.resolution is not None else (x, y)
+
+    def _ring_for(self, frame):
+        """按首帧大小创建帧环；分辨率变大时换一个更大的帧环，序号继续递增"""
+        ring = self.frame_ring
+        if ring is None or not ring.fits(frame):
+            self.frame_ring = FrameRing(FRAME_RING_SLOTS, frame_nbytes(frame),
+                                        start_seq=ring.last_seq if ring else 0)
+            if ring is not None:
+                ring.close()
+        return self.frame_ring
+
+    def _ensure_worker(self):
+        # lazy start worker（由共享调度器处理时不启动自带线程）
+        if self.scheduler is None and self.worker_thread is None:
+            self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+            self.worker_thread.start()
+
+    def _submit(self, ring, ring_seq, now_dt):
+        """多进程模式：把帧环中的帧交给识别进程，候选检查按提交时的画面状态确定"""
+        METRICS.inc("frames", device=self.device_id, result="processed")
+        with self._seq_lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._submitted[seq] = now_dt
+        self.executor.submit(self, seq, ring, ring_seq, self.screen_state.candidates(now_dt.timestamp()))
+
+    def deliver(self, seq, detection):
+        """识别进程返回结果（可能乱序）：按帧序号重排后放入队列，由调度器/自带线程依次应用"""
+        with self._seq_lock:
+            self._results[seq] = detection
+            while self._apply_seq in self._results:
+                ready = self._results.pop(self._apply_seq)
+                now_dt = self._submitted.pop(self._apply_seq)
+                self._apply_seq += 1
+                # 编号在应用时取当前值，与按序写日志保持一致
+                if ready.checked == 0:
+                    # 识别前已被帧环覆盖或识别进程失效
+                    METRICS.inc("frames", device=self.device_id, result="dropped")
+                self.frame_queue.put_nowait((None, now_dt, None, ready))
+        self._ensure_worker()
+        if self.scheduler is not None:
+            self.scheduler.notify(self)
+
     def _write_log(self, key, message_parts, now_dt, scount=None):
         """统一写CSV日志并更新去重记录；scount 可覆盖使用的 screenshot_count
-        线程安全：在此函数内统一加锁检查并更新去重字典。
+        线程安全：去重由 log_dedup 完成（自带锁）。
         message_parts: 元组，对应CSV列（类型,等级,比赛名称,身位,附加道具）
         """
         if scount is None:
             scount = self.screenshot_count
-        with self._lock:
-            if not self._should_write(key, now_dt):
-                return False
-            self.last_logs[key] = now_dt
+        if not self.log_dedup.check(key, now_dt.timestamp()):
+            return False
         ts = now_dt.strftime("%Y-%m-%d %H:%M:%S")
-        # 构造CSV行（截图编号,时间戳,类型,等级,比赛名称,身位,附加道具）
+        # 构造CSV行（截图编号,时间戳,类型,等级,比赛名称,身位,附加道具），空值由日志替换为"-"
         csv_parts = [f"{scount:05d}", ts] + list(message_parts)
-        # 处理空值，替换为"-"
-        csv_parts = [part if part is not None and part != "" else "-" for part in csv_parts]
-        csv_line = ",".join(csv_parts) + "\n"
-        # 将文件写入置于锁外以减少临界区时间
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(csv_line)
+        self.event_log.append(csv_parts)
         return True
 
-    def _update_last_race_items(self, items):
-        """更新上一个比赛的道具掉落信息，并同步更新CSV日志"""
+    def _update_last_race_items(self, items, now_dt=None):
+        """更新上一个比赛的道具掉落信息，并向CSV日志追加一条掉落补充记录"""
         with self._race_log_lock:
             if self.last_race_log["scount"] is None:
                 return False
-            # 添加新道具（去重）
+            # 添加新道具（去重）；没有新道具时无需追加记录
+            added = False
             for item in items:
                 if item not in self.last_race_log["items"]:
                     self.last_race_log["items"].append(item)
+                    added = True
+            if not added:
+                return False
             items_str = ",".join(self.last_race_log["items"]) if self.last_race_log["items"] else "-"
-            
-            # 读取原有CSV内容，更新对应行
-            temp_log_path = os.path.join(base_dir_path(), "log_temp.csv")
-            updated = False
-            with open(log_path, "r", encoding="utf-8") as f, open(temp_log_path, "w", encoding="utf-8") as temp_f:
-                # 写入表头
-                header = f.readline()
-                temp_f.write(header)
-                # 遍历每一行
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        temp_f.write("\n")
-                        continue
-                    parts = line.split(",")
-                    if len(parts) < 1:
-                        temp_f.write(line + "\n")
-                        continue
-                    # 匹配截图编号
-                    if parts[0] == f"{self.last_race_log['scount']:05d}":
-                        # 更新附加道具列
-                        parts[-1] = items_str
-                        updated_line = ",".join(parts)
-                        temp_f.write(updated_line + "\n")
-                        updated = True
-                    else:
-                        temp_f.write(line + "\n")
-            # 替换原日志文件
-            if updated:
-                os.replace(temp_log_path, log_path)
-            else:
-                os.remove(temp_log_path)
-            return updated
+            scount = self.last_race_log["scount"]
+        # 不再重写整个文件：导出时按序号合并回比赛行（见 event_log.export_csv）
+        ts = (now_dt or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        self.event_log.amend_items(scount, ts, items_str)
+        return True
 
     def _worker_loop(self):
         """后台消费队列，逐帧调用识别处理函数。"""
         while not self.stop_event.is_set():
             try:
-                screen_bgr, screen_gray, now_dt, scount = self.frame_queue.get(timeout=1)
+                item = self.frame_queue.get(timeout=1)
             except Empty:
                 continue
             try:
-                self._match_template_and_ocr(screen_bgr, screen_gray, now_dt=now_dt, scount=scount)
+                self.process_queued(item)
             except Exception:
                 # 捕获单帧处理异常，避免线程退出
                 pass
 
+    def process_queued(self, item):
+        """处理一帧队列中的数据（自带线程或共享调度器调用）
+        item 中带有识别结果时（多进程模式）只做应用；否则从帧环读取该帧（零拷贝）识别
+        """
+        ring_seq, now_dt, scount, detection = item
+        if detection is None:
+            ring = self.frame_ring
+            frame = ring.get(ring_seq)
+            if frame is None:
+                METRICS.inc("frames", device=self.device_id, result="dropped")
+                return
+            with METRICS.timer("stage", stage="recognize", device=self.device_id):
+                detection = recognize_frame(frame, None, self.screen_state.candidates(now_dt.timestamp()),
+                                            self.templates)
+            del frame
+            # 识别期间该槽位被新帧覆盖：结果可能来自半帧，丢弃
+            if not ring.valid(ring_seq):
+                METRICS.inc("frames", device=self.device_id, result="dropped")
+                return
+        with METRICS.timer("stage", stage="apply", device=self.device_id):
+            screen = self._match_template_and_ocr(None, None, now_dt=now_dt, scount=scount,
+                                                  detection=detection)
+        self.last_screen = screen
+        self.last_screen_at = time.monotonic()
+        if self.first_recognized_at is None:
+            self.first_recognized_at = time.perf_counter()
+
     def stop(self, wait=True):
-        """停止后台线程（可在程序退出时调用）。"""
+        """停止后台线程并写完日志（可在程序退出时调用）。"""
         self.stop_event.set()
         if self.worker_thread is not None and wait:
             self.worker_thread.join(timeout=2)
+        self.actions.stop(wait=wait)
+        self.event_log.close()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
 
-    def _match_template_and_ocr(self, screen_bgr, screen_gray, now_dt=None, scount=None):
+    def _match_template_and_ocr(self, screen_bgr, screen_gray, now_dt=None, scount=None, detection=None):
         """主处理逻辑
         支持异步调用：接受 `now_dt`（帧捕获时间）和 `scount`（该帧编号）。
         若未传入则在函数内使用当前时间与默认编号。
+        识别（recognition.recognize_frame，只按 screen_state 给出的候选检查）与应用分开：
+        传入 detection 时（多进程识别的结果）只做应用。
+        返回识别出的画面状态名称（未识别返回 None）
         """
-
-
         if now_dt is None:
             now_dt = datetime.now()
         if scount is None:
             scount = self.screenshot_count
 
-
-
-        # 道具掉落识别（优先处理）
-        ri = match_template_in_region(screen_gray, TEMPLATE_RACE_ITEM, ROI_ITEM_DROP, threshold=MATCH_FINE)
-        if ri:
-            # 轮流匹配 item_01 到 item_10 并写入对应道具名
-            item_names = {
-                1: '钻石', 
-                2: '女神像',
-            }
-
-            found_items = []  # 存储所有找到的道具
-
-            for i in range(1, 3):
-                tpl = getattr(config_module, f'TEMPLATE_ITEM_{i:02d}', None)
-                if tpl is None:
-                    # 退回到全局名称（import *）查找
-                    tpl = globals().get(f'TEMPLATE_ITEM_{i:02d}')
-                if tpl is None:
-                    continue
-                
-                loc = match_template_in_region(screen_gray, tpl, ROI_ITEM_DROP, threshold=0.5)
-                if loc:
-                    name = item_names.get(i, f'item_{i:02d}')
-                    found_items.append(name)
-
-            # 根据找到的道具数量处理（无掉落不输出）
-            if found_items:
-                # 汇总道具
-                if len(found_items) > 1:
-                    items_str = ', '.join(found_items)
-                    # 控制台输出去重
-                    self._console_output_duplicate_check(('item_drop', 'multiple'), f"\033[95m掉落{items_str}\033[0m")
-                    # 更新上一个比赛的道具信息
-                    self._update_last_race_items(found_items)
-                else:
-                    item_name = found_items[0]
-                    # 控制台输出去重
-                    self._console_output_duplicate_check(('item_drop', item_name), f"\033[95m掉落{item_name}\033[0m")
-                    # 更新上一个比赛的道具信息
-                    self._update_last_race_items(found_items)
-            return
-
-        # 1) 在 ROI_RACE_RESULT 区域匹配 race_result 模板
-        rr = match_template_in_region(screen_gray, TEMPLATE_RACE_RESULT, ROI_RACE_RESULT, threshold=MATCH_FINE)
-        if rr:
-            # 在 winner 区域判断胜负（改为检查屏幕上点 (200,300) 的色值是否为 #FFDD50）
-            win = 0
-            try:
-                h, w = screen_bgr.shape[:2]
-                px_x, px_y = 500, 700
-                if 0 <= px_x < w and 0 <= px_y < h:
-                    b = int(screen_bgr[px_y, px_x, 0])
-                    g = int(screen_bgr[px_y, px_x, 1])
-                    r = int(screen_bgr[px_y, px_x, 2])
-
-                    #FFF5C7 -> RGB(255,245,199) -> BGR(199,245,255)
-                    # Allow ±10 tolerance range for RGB values
-                    if abs(r - 255) <= 10 and abs(g - 245) <= 10 and abs(b - 199) <= 10:
-                        win = 1
-            except Exception:
-                win = 0
-
-            if win == 1:
-                self._record_race(screen_bgr, screen_gray, now_dt, success=True, scount=scount)
+        now = now_dt.timestamp()
+        if detection is None:
+            detection = recognize_frame(screen_bgr, screen_gray, self.screen_state.candidates(now), self.templates)
+        self.screen_state.update(detection.screen, detection.checked, now)
+        METRICS.inc("screen_checks", detection.checked, device=self.device_id)
+        if detection.screen is not None:
+            self._appliers[detection.screen](detection.data, now_dt, scount)
+        return detection.screen
+
+    def _apply_item_drop(self, data, now_dt, scount):
+        found_items = data["items"]
+        # 根据找到的道具数量处理（无掉落不输出）
+        if found_items:
+            # 汇总道具
+            if len(found_items) > 1:
+                items_str = ', '.join(found_items)
+                # 控制台输出去重
+                self._console_output_duplicate_check(('item_drop', 'multiple'), f"\033[95m掉落{items_str}\033[0m")
+                # 更新上一个比赛的道具信息
+                self._update_last_race_items(found_items, now_dt)
             else:
-                self._record_race(screen_bgr, screen_gray, now_dt, success=False, scount=scount)
-            return
+                item_name = found_items[0]
+                # 控制台输出去重
+                self._console_output_duplicate_check(('item_drop', item_name), f"\033[95m掉落{item_name}\033[0m")
+                # 更新上一个比赛的道具信息
+                self._update_last_race_items(found_items, now_dt)
 
-        # 4) 检查 other_home 模板（钻石识别）
-        oh = match_template_loc(screen_gray, TEMPLATE_OTHER_HOME, threshold=0.6)
-        if oh:
-            self._process_diamond(screen_bgr, now_dt, scount=scount)
+    def _apply_race_result(self, data, now_dt, scount):
+        if not data["level"]:
             return
+        self._record_race(data["level"], data["name"], data["position"], now_dt,
+                          success=data["success"], scount=scount)
 
-        # 5) 检查 other_jinhui 模板
-        oj = match_template_loc(screen_gray, TEMPLATE_OTHER_JINHUI, threshold=MATCH_ROUGH)
-        if oj:
-            # 控制台输出去重
-            self._console_output_duplicate_check(('jinhui',), "\033[94m金回hint\033[0m")
-            self._write_log(('jinhui',), ("其他", "-", "-", "-", "金回hint已习得"), now_dt, scount=scount-1)
-            return
+    def _apply_home(self, data, now_dt, scount):
+        self._process_diamond(data["text"], now_dt, scount=scount)
 
-        # 6) 检查跳过/因子 (默认开启)
-        loc = match_template_loc(screen_gray, TEMPLATE_Skip, threshold=MATCH_ROUGH) or \
-              match_template_loc(screen_gray, TEMPLATE_Yinzi, threshold=MATCH_ROUGH)
-        if loc:
-            cx, cy = loc[0], loc[1]
-            adb_tap(self.device_id, cx, cy)
-            return
+    def _apply_jinhui(self, data, now_dt, scount):
+        # 控制台输出去重
+        self._console_output_duplicate_check(('jinhui',), "\033[94m金回hint\033[0m")
+        self._write_log(('jinhui',), ("其他", "-", "-", "-", "金回hint已习得"), now_dt, scount=scount-1)
 
-        # 7) 检查 jitaend 模板 (默认开启)
-        loc = match_template_loc(screen_gray, TEMPLATE_JitaEnd, threshold=MATCH_ROUGH)
-        if loc:
-            cx, cy = loc[0], loc[1]
-            adb_tap(self.device_id, cx, cy)
-            time.sleep(1)
-            adb_tap(self.device_id, 520, 1070)
-            time.sleep(1)
-            adb_tap(self.device_id, 700, 40)
-            time.sleep(1)
-            adb_tap(self.device_id, 700, 40)
-            time.sleep(1)
-            adb_tap(self.device_id, 490, 180)
-            time.sleep(5)
-            adb_tap(self.device_id, 360, 1210)
-            return
+    def _apply_skip(self, data, now_dt, scount):
+        cx, cy = data["tap"]
+        self.actions.tap(cx, cy, name="skip")
 
-    def _process_diamond(self, screen_bgr, now_dt, scount=None):
-        """处理钻石识别逻辑
+    def _apply_jitaend(self, data, now_dt, scount):
+        cx, cy = data["tap"]
+        self.actions.macro("jitaend", ((0, cx, cy),) + JITAEND_STEPS)
+
+    def _process_diamond(self, text, now_dt, scount=None):
+        """处理钻石识别逻辑（text 为钻石区域的 OCR 结果）
         支持异步传入的 `now_dt` 和 `scount`。
         """
-        ocr_region_coords = (420, 94, 515, 120)
-        text = pytesseract.image_to_string(
-            screen_bgr[ocr_region_coords[1]:ocr_region_coords[3],
-                       ocr_region_coords[0]:ocr_region_coords[2]],
-            config='--psm 7 -c tessedit_char_whitelist=0123456789'
-        ).strip()
-        
         m = re.search(r'^\d+$', text.replace(',', ''))
         if not m:
             return
 
         current = int(m.group())
-        now_ts = datetime.now()
+        now_ts = now_dt
 
         if self.prev_diamond is None:
             self.prev_diamond = current
@@ -345,21 +394,10 @@ class RaceRecorder:
                 self._write_log(('diamond_increase', current, diff), ("其他", "-", "-", "-", f"钻石：{current} | 增加：{diff}"), now_ts, scount=prev_scount)
                 self.last_diamond_time = now_ts
 
-    def _record_race(self, screen_bgr, screen_gray, now_dt, success=True, scount=None):
-        """根据原逻辑记录 race 日志；若 success=False 则记录为失败（但仍写格式）"""
-
-        # 匹配竞赛等级
-        level_templates = {"G1": TEMPLATE_G1, "G2": TEMPLATE_G2, "G3": TEMPLATE_G3, "URA": TEMPLATE_SP}
-        race_level = match_template_label(screen_gray, REGION1, level_templates) 
-        if not race_level:
-            return
-
-        # OCR 比赛名和信息
-        race_name = ocr_region(REGION2, screen_bgr)
-
-        # 匹配身位差
-        position_templates = {"8 身位": TEMPLATE_8L, "9 身位": TEMPLATE_9L, "10身位": TEMPLATE_10L, "大差距": TEMPLATE_LON}
-        position_result = match_template_label(screen_gray, REGION4, position_templates) or "身位不足"
+    def _record_race(self, race_level, race_name, position_result, now_dt, success=True, scount=None):
+        """根据原逻辑记录 race 日志；若 success=False 则记录为失败（但仍写格式）
+        等级、比赛名、身位由 recognition.detect_race_result 识别
+        """
 
         # 去重检查（保留原有逻辑）
         with self._lock:
@@ -1,40 +1,242 @@
 import time
+# 启动计时从导入之前开始，用于统计启动到首帧识别完成的耗时
+STARTED_AT = time.perf_counter()
+import os
+import re
 import argparse
-from utils import list_connected_devices, choose_device_interactively, adb_screenshot
-from logic import RaceRecorder
-from config import CAPTURE_INTERVAL
+import threading
+import multiprocessing
+from paths import base_dir_path, default_log_path
+from config import RECOGNITION_WORKERS, RECOGNITION_EXECUTOR, RECOGNITION_PROCESSES, METRICS_PORT, STATS_FILE, STATS_INTERVAL, STATS_KEEP, LOG_STATS_SUFFIX
+from metrics import METRICS
+# cv2 / numpy 以及识别相关模块只在 run 命令中导入（见 main），export / stats / bundle 不加载
+
+
+def device_log_path(device_id):
+    """多设备模式下每台设备单独的日志文件，例如 log_127.0.0.1_5555.csv"""
+    safe = re.sub(r'[^0-9A-Za-z._-]', '_', device_id)
+    return os.path.join(base_dir_path(), f"log_{safe}.csv")
+
+
+def resolve_devices(spec, devices):
+    """解析 --devices：all，或逗号分隔的设备序号/ID"""
+    if spec.strip().lower() == "all":
+        return list(devices)
+    chosen = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item.isdigit() and 1 <= int(item) <= len(devices):
+            item = devices[int(item) - 1]
+        if item in devices:
+            if item not in chosen:
+                chosen.append(item)
+        elif item:
+            print(f"警告：设备 {item} 不在线，已忽略")
+    return chosen
+
+
+_startup_lock = threading.Lock()
+_startup_reported = False
+
+
+def report_startup(recorder):
+    """第一台设备的首帧识别完成后输出一次启动耗时"""
+    global _startup_reported
+    if _startup_reported or recorder.first_recognized_at is None:
+        return
+    with _startup_lock:
+        if _startup_reported:
+            return
+        _startup_reported = True
+    seconds = recorder.first_recognized_at - STARTED_AT
+    METRICS.set_gauge("startup_seconds", round(seconds, 3))
+    print(f"提示：启动到首帧识别完成用时 {seconds:.2f}s")
+
+
+def capture_loop(device_id, recorder, stop_event):
+    """单台设备的截图循环：截图间隔由 CapturePacer 按画面状态自适应调整"""
+    from utils import adb_screenshot
+    from capture_pacing import CapturePacer
+    pacer = CapturePacer()
+    while not stop_event.is_set():
+        started = time.monotonic()
+        static = False
+        screen_bgr = adb_screenshot(device_id)
+        if screen_bgr is not None:
+            try:
+                static = recorder.process_frame(screen_bgr) is False
+            except Exception as e:
+                print(f"处理帧时出错：{e}")
+        report_startup(recorder)
+        interval = pacer.next_interval(recorder.last_screen, recorder.last_screen_at, static)
+        METRICS.set_gauge("capture_interval", round(interval, 3), device=device_id)
+        # 间隔按截图开始时刻计算，截图和入队本身的耗时不再额外叠加
+        remaining = interval - (time.monotonic() - started)
+        if remaining > 0:
+            stop_event.wait(remaining)
+
 
 def main():
     parser = argparse.ArgumentParser(description="赛马娘比赛记录")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "export", "stats", "bundle"],
+                        help="run=监听设备（默认）；export=把日志导出为合并掉落后的 CSV；stats=增量统计胜率与掉落；"
+                             "bundle=把模板打包为启动时内存映射的模板包")
+    parser.add_argument("--input", "-i", default=default_log_path(), help="export / stats 读取的日志文件")
+    parser.add_argument("--output", "-o", default="log_export.csv", help="export 的输出文件")
     parser.add_argument("--device", "-d", help="要监控的ADB设备序号或ID，例如 1 或 emulator-5554")
+    parser.add_argument("--devices", help="同时监控多台设备：all 或逗号分隔的序号/ID，每台设备单独写日志")
+    parser.add_argument("--capture", choices=["raw", "png"], help="截图方式：raw=原始帧（默认），png=PNG 编码")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="在该端口提供 Prometheus /metrics（0 表示不开启）")
+    parser.add_argument("--stats-file", default=STATS_FILE, help="定期把各阶段耗时统计写入该 JSON 文件（自动轮转）")
+    parser.add_argument("--executor", choices=["thread", "process"], default=RECOGNITION_EXECUTOR,
+                        help="识别方式：thread=识别线程；process=多进程，使用全部核心")
+    parser.add_argument("--processes", type=int, default=RECOGNITION_PROCESSES,
+                        help="process 模式的识别进程数（0 表示 CPU 核数 - 1）")
     args = parser.parse_args()
 
+    if args.command == "export":
+        from event_log import export_csv
+        count = export_csv(args.input, args.output)
+        print(f"已导出 {count} 条记录到 {args.output}")
+        return
+    if args.command == "stats":
+        from log_stats import LogStats
+        if not os.path.isfile(args.input):
+            print(f"错误：日志文件不存在：{args.input}")
+            return
+        stats = LogStats(args.input, args.input + LOG_STATS_SUFFIX)
+        count = stats.update()
+        stats.save()
+        print(f"新增 {count} 条记录")
+        print(stats.report())
+        return
+    if args.command == "bundle":
+        from templates import build_bundle
+        from config import ASSET_BUNDLE
+        try:
+            count = build_bundle(ASSET_BUNDLE)
+        except FileNotFoundError as e:
+            print(f"错误：{e}")
+            return
+        print(f"已把 {count} 个模板打包到 {ASSET_BUNDLE}.npy / .json")
+        return
+
+    from utils import list_connected_devices, choose_device_interactively, set_capture_mode
+    from logic import RaceRecorder
+    from scheduler import FairScheduler
+    from templates import get_template_bank
+    from ocr import get_ocr_engine
+    from digits import get_digit_recognizer
+    from recognition import ProcessRecognizer
+    from capture_pacing import get_cpu_budget
+
+    # 启动时预加载模板，缺失资源直接退出而不是每帧报错
+    try:
+        bank = get_template_bank()
+    except FileNotFoundError as e:
+        print(f"错误：{e}")
+        return
+    if bank.missing:
+        print(f"提示：以下可选模板未找到，将被跳过：{', '.join(bank.missing)}")
+
     devices = list_connected_devices()
     if not devices:
         print("未检测到任何设备，程序退出。")
         return
-    if args.device and args.device in devices:
-        device_id = args.device
+    if args.devices:
+        device_ids = resolve_devices(args.devices, devices)
+        if not device_ids:
+            print("没有可监控的设备，程序退出。")
+            return
+    elif args.device and args.device in devices:
+        device_ids = [args.device]
     else:
-        device_id = choose_device_interactively(devices)
+        device_ids = [choose_device_interactively(devices)]
+    if args.capture:
+        for device_id in device_ids:
+            set_capture_mode(device_id, args.capture)
+
+    stop_event = threading.Event()
+    if args.metrics_port or args.stats_file:
+        METRICS.enabled = True
+    if args.metrics_port:
+        try:
+            METRICS.serve(args.metrics_port)
+            print(f"提示：性能指标见 http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            print(f"警告：无法在端口 {args.metrics_port} 提供性能指标：{e}")
+    stats_thread = None
+    if args.stats_file:
+        stats_thread = METRICS.write_stats_periodically(args.stats_file, STATS_INTERVAL, STATS_KEEP, stop_event)
 
-    recorder = RaceRecorder(device_id)
-    print(f"→ 已选择设备：{device_id}，开始监听…\n")
+    executor = None
+    if args.executor == "process":
+        # 多进程：识别在子进程中进行，本进程的线程只按帧序号应用结果
+        executor = ProcessRecognizer(processes=args.processes)
+        executor.start()
+        # 识别 CPU 主要花在子进程里，截图 CPU 预算需要把它们算进去
+        get_cpu_budget().add_source(executor.cpu_time)
+        print(f"提示：使用 {executor.processes} 个识别进程")
+
+    scheduler = None
+    if len(device_ids) == 1:
+        recorders = [RaceRecorder(device_ids[0], executor=executor)]
+        print(f"→ 已选择设备：{device_ids[0]}，开始监听…\n")
+    else:
+        # 多设备：模板与 OCR 引擎进程内共享，识别线程按设备轮转调度
+        scheduler = FairScheduler(workers=min(len(device_ids), RECOGNITION_WORKERS))
+        recorders = [
+            RaceRecorder(d, log_file=device_log_path(d), scheduler=scheduler, console_prefix=f"[{d}] ",
+                         executor=executor)
+            for d in device_ids
+        ]
+        scheduler.start()
+        print(f"→ 已选择设备：{', '.join(device_ids)}，开始监听…\n")
 
     try:
-        while True:
-            screen_bgr = adb_screenshot(device_id)
-            if screen_bgr is not None:
-                try:
-                    recorder.process_frame(screen_bgr)
-                except Exception as e:
-                    print(f"处理帧时出错：{e}")
-                    continue
-            time.sleep(CAPTURE_INTERVAL)
+        if len(recorders) == 1:
+            capture_loop(device_ids[0], recorders[0], stop_event)
+        else:
+            threads = [
+                threading.Thread(target=capture_loop, args=(d, r, stop_event), name=f"capture-{d}", daemon=True)
+                for d, r in zip(device_ids, recorders)
+            ]
+            for t in threads:
+                t.start()
+            while any(t.is_alive() for t in threads):
+                time.sleep(0.5)
     except KeyboardInterrupt:
         print("\n监听结束，程序退出。")
     except Exception as e:
         print(f"程序异常终止：{e}")
+    finally:
+        stop_event.set()
+        if executor is not None:
+            executor.stop()
+            print(executor.describe())
+        if scheduler is not None:
+            scheduler.stop()
+        for recorder in recorders:
+            recorder.stop()
+            print(recorder.console_prefix + recorder.change_detector.describe())
+            print(recorder.console_prefix + recorder.screen_state.describe())
+            print(recorder.console_prefix + recorder.actions.describe())
+        if stats_thread is not None:
+            stats_thread.join(timeout=5)
+        if get_digit_recognizer.cache_info().currsize:
+            get_digit_recognizer().save()
+            print(get_digit_recognizer().describe())
+        # 保存 OCR 缓存等资源（从未识别过文字时不再为此创建 OCR 引擎）
+        if get_ocr_engine.cache_info().currsize:
+            engine = get_ocr_engine()
+            cache = getattr(engine, "cache", None)
+            if cache is not None:
+                stats = cache.stats()
+                print(f"OCR 缓存：命中 {stats['hits']}，未命中 {stats['misses']}")
+            engine.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 打包为 exe 后子进程需要
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,214 @@
+import os
+import time
+import json
+import bisect
+import threading
+
+PREFIX = "umarecorder_"
+# 直方图桶上界（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _NullTimer:
+    """关闭统计时使用的空计时器，几乎没有开销"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+# ========= 指标注册表 =========
+class Metrics:
+    """进程内指标：阶段耗时直方图、计数器、瞬时值。enabled=False 时所有记录调用直接返回"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    # ----- 跨进程汇总 -----
+    def drain(self):
+        """取出并清空本进程记录的计数器和直方图（识别子进程定期发给主进程合并）；瞬时值原样带上"""
+        with self._lock:
+            delta = {
+                "counters": list(self._counters.items()),
+                "gauges": list(self._gauges.items()),
+                "histograms": [(k, h.counts, h.total, h.count) for k, h in self._histograms.items()],
+            }
+            self._counters = {}
+            self._histograms = {}
+        return delta
+
+    def merge(self, delta):
+        """合并子进程 drain() 的结果"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for key, value in delta["counters"]:
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, value in delta["gauges"]:
+                self._gauges[key] = value
+            for key, counts, total, count in delta["histograms"]:
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = _Histogram()
+                hist.counts = [a + b for a, b in zip(hist.counts, counts)]
+                hist.total += total
+                hist.count += count
+
+    # ----- 导出 -----
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"{PREFIX}{name}_total{_fmt_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {value}")
+            for (name, labels), hist in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{PREFIX}{name}_seconds_bucket{_fmt_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{PREFIX}{name}_seconds_sum{_fmt_labels(labels)} {hist.total}")
+                lines.append(f"{PREFIX}{name}_seconds_count{_fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """JSON 友好的快照（统计文件使用）"""
+        def name_of(name, labels):
+            return name + _fmt_labels(labels)
+        with self._lock:
+            return {
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "counters": {name_of(*k): v for k, v in self._counters.items()},
+                "gauges": {name_of(*k): v for k, v in self._gauges.items()},
+                "histograms": {
+                    name_of(*k): {"count": h.count, "sum": h.total, "buckets": h.counts}
+                    for k, h in self._histograms.items()
+                },
+            }
+
+    def serve(self, port, host="127.0.0.1"):
+        """在后台线程提供 /metrics 端点"""
+        # 只有开启 --metrics-port 时才需要 http.server，不在启动时加载
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def write_stats_periodically(self, path, interval, keep, stop_event):
+        """每 interval 秒写一次统计文件，保留 keep 个历史版本（path.1 为最近的上一份）"""
+        def loop():
+            while not stop_event.wait(interval):
+                self.write_stats(path, keep)
+            self.write_stats(path, keep)
+
+        t = threading.Thread(target=loop, name="metrics-file", daemon=True)
+        t.start()
+        return t
+
+    def write_stats(self, path, keep):
+        for i in range(keep - 1, 0, -1):
+            src = path if i == 1 else f"{path}.{i - 1}"
+            if os.path.isfile(src):
+                os.replace(src, f"{path}.{i}")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1)
+
+
+METRICS = Metrics()
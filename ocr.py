@@ -0,0 +1,231 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+import threading
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from paths import resource_path, base_dir_path
+from config import OCR_BACKEND, OCR_CACHE_SIZE, OCR_CACHE_PERSIST
+from ocr_cache import OcrCache, roi_key
+from metrics import METRICS
+
+TESSERACT_DIR = resource_path("assets/tessdata")
+TESSDATA_DIR = resource_path("assets/tessdata/tessdata")
+TESSERACT_CMD = os.path.join(TESSERACT_DIR, "tesseract.exe")
+os.environ["TESSDATA_PREFIX"] = TESSDATA_DIR
+
+# 一次识别请求：image 为 RGB/灰度 ndarray，whitelist 为允许字符（None 表示不限制）
+OcrRequest = namedtuple("OcrRequest", "image lang psm whitelist", defaults=("chi_sim", 7, None))
+
+
+# ========= OCR 后端接口 =========
+class OcrBackend:
+    name = "base"
+
+    def recognize(self, image, lang="chi_sim", psm=7, whitelist=None):
+        METRICS.inc("ocr_calls", backend=self.name)
+        with METRICS.timer("stage", stage="ocr"):
+            return self._recognize(image, lang, psm, whitelist)
+
+    def recognize_batch(self, requests):
+        """批量识别，返回与 requests 顺序一致的文本列表"""
+        METRICS.inc("ocr_calls", len(requests), backend=self.name)
+        with METRICS.timer("stage", stage="ocr_batch"):
+            return self._recognize_batch(requests)
+
+    def _recognize(self, image, lang, psm, whitelist):
+        raise NotImplementedError
+
+    def _recognize_batch(self, requests):
+        return [self._recognize(r.image, r.lang, r.psm, r.whitelist) for r in requests]
+
+    def close(self):
+        pass
+
+
+# ========= pytesseract 后端（每次调用启动 tesseract 进程） =========
+class PytesseractBackend(OcrBackend):
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+        if os.path.isfile(TESSERACT_CMD):
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        self._pytesseract = pytesseract
+
+    def _recognize(self, image, lang, psm, whitelist):
+        config = f"--psm {psm}"
+        if whitelist:
+            config += f" -c tessedit_char_whitelist={whitelist}"
+        return self._pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+# ========= libtesseract 直连后端（进程内常驻，语言只加载一次） =========
+def _load_libtesseract():
+    if sys.platform == "win32":
+        if hasattr(os, "add_dll_directory"):
+            os.add_dll_directory(TESSERACT_DIR)
+        candidates = [os.path.join(TESSERACT_DIR, "libtesseract-5.dll")]
+    else:
+        candidates = [ctypes.util.find_library("tesseract"), "libtesseract.so.5", "libtesseract.dylib"]
+    last_error = None
+    for path in candidates:
+        if not path:
+            continue
+        try:
+            return ctypes.CDLL(path)
+        except OSError as e:
+            last_error = e
+    raise OSError(f"未找到 libtesseract：{last_error}")
+
+
+def _bind(lib):
+    p, c, i = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int
+    signatures = {
+        "TessBaseAPICreate": (p, []),
+        "TessBaseAPIInit3": (i, [p, c, c]),
+        "TessBaseAPISetPageSegMode": (None, [p, i]),
+        "TessBaseAPISetVariable": (i, [p, c, c]),
+        "TessBaseAPISetImage": (None, [p, c, i, i, i, i]),
+        "TessBaseAPISetSourceResolution": (None, [p, i]),
+        "TessBaseAPIGetUTF8Text": (p, [p]),
+        "TessBaseAPIClear": (None, [p]),
+        "TessBaseAPIEnd": (None, [p]),
+        "TessBaseAPIDelete": (None, [p]),
+        "TessDeleteText": (None, [p]),
+    }
+    for fname, (restype, argtypes) in signatures.items():
+        fn = getattr(lib, fname)
+        fn.restype = restype
+        fn.argtypes = argtypes
+    return lib
+
+
+class TessApiBackend(OcrBackend):
+    """通过 ctypes 调用 libtesseract C API，每种语言一个常驻 TessBaseAPI 实例"""
+    name = "tessapi"
+
+    def __init__(self, datapath=TESSDATA_DIR):
+        self._lib = _bind(_load_libtesseract())
+        self._datapath = datapath.encode("utf-8")
+        self._apis = {}
+        self._lock = threading.Lock()
+
+    def _api(self, lang):
+        api = self._apis.get(lang)
+        if api is None:
+            api = self._lib.TessBaseAPICreate()
+            if self._lib.TessBaseAPIInit3(api, self._datapath, lang.encode("utf-8")) != 0:
+                self._lib.TessBaseAPIDelete(api)
+                raise RuntimeError(f"tesseract 语言初始化失败：{lang}")
+            self._apis[lang] = api
+        return api
+
+    def _recognize_locked(self, api, image, psm, whitelist):
+        lib = self._lib
+        img = np.ascontiguousarray(image, dtype=np.uint8)
+        h, w = img.shape[:2]
+        bpp = 1 if img.ndim == 2 else img.shape[2]
+        lib.TessBaseAPISetPageSegMode(api, psm)
+        lib.TessBaseAPISetVariable(api, b"tessedit_char_whitelist", (whitelist or "").encode("utf-8"))
+        lib.TessBaseAPISetImage(api, img.ctypes.data_as(ctypes.c_char_p), w, h, bpp, img.strides[0])
+        lib.TessBaseAPISetSourceResolution(api, 70)
+        ptr = lib.TessBaseAPIGetUTF8Text(api)
+        try:
+            return ctypes.string_at(ptr).decode("utf-8", "replace") if ptr else ""
+        finally:
+            if ptr:
+                lib.TessDeleteText(ptr)
+            lib.TessBaseAPIClear(api)
+
+    def _recognize(self, image, lang, psm, whitelist):
+        with self._lock:
+            return self._recognize_locked(self._api(lang), image, psm, whitelist)
+
+    def _recognize_batch(self, requests):
+        # 一次加锁处理整批，同语言请求复用同一实例
+        with self._lock:
+            return [self._recognize_locked(self._api(r.lang), r.image, r.psm, r.whitelist) for r in requests]
+
+    def close(self):
+        with self._lock:
+            for api in self._apis.values():
+                self._lib.TessBaseAPIEnd(api)
+                self._lib.TessBaseAPIDelete(api)
+            self._apis.clear()
+
+
+# ========= 结果缓存包装 =========
+class CachedOcrBackend(OcrBackend):
+    """相同二值化内容的 ROI 直接返回缓存文本，不再调用 tesseract"""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.name = f"{backend.name}+cache"
+
+    def recognize(self, image, lang="chi_sim", psm=7, whitelist=None):
+        key = roi_key(image, lang, psm, whitelist)
+        text = self.cache.get(key)
+        if text is None:
+            METRICS.inc("ocr_requests", result="miss")
+            text = self.backend.recognize(image, lang, psm, whitelist)
+            self.cache.put(key, text)
+        else:
+            METRICS.inc("ocr_requests", result="hit")
+        return text
+
+    def recognize_batch(self, requests):
+        keys = [roi_key(r.image, r.lang, r.psm, r.whitelist) for r in requests]
+        results = [self.cache.get(k) for k in keys]
+        pending = [i for i, text in enumerate(results) if text is None]
+        METRICS.inc("ocr_requests", len(pending), result="miss")
+        METRICS.inc("ocr_requests", len(requests) - len(pending), result="hit")
+        if pending:
+            texts = self.backend.recognize_batch([requests[i] for i in pending])
+            for i, text in zip(pending, texts):
+                results[i] = text
+                self.cache.put(keys[i], text)
+        return results
+
+    def close(self):
+        self.cache.save()
+        self.backend.close()
+
+
+# ========= 后端选择 =========
+def create_backend(name=OCR_BACKEND):
+    """name: auto / tessapi / pytesseract；auto 优先使用 libtesseract，失败回退 pytesseract"""
+    if name in ("auto", "tessapi"):
+        try:
+            return TessApiBackend()
+        except (OSError, AttributeError) as e:
+            if name == "tessapi":
+                raise
+            print(f"提示：libtesseract 不可用（{e}），OCR 回退到 pytesseract")
+    return PytesseractBackend()
+
+
+# 是否读写 ocr_cache.json；回放时由 use_private_ocr_engine 关闭
+_persist_cache = OCR_CACHE_PERSIST
+
+
+@lru_cache(maxsize=1)
+def get_ocr_engine():
+    """进程内共享的 OCR 引擎（按配置套上结果缓存）"""
+    backend = create_backend()
+    if OCR_CACHE_SIZE > 0:
+        path = os.path.join(base_dir_path(), "ocr_cache.json") if _persist_cache else None
+        backend = CachedOcrBackend(backend, OcrCache(OCR_CACHE_SIZE, path))
+    return backend
+
+
+def use_private_ocr_engine():
+    """回放/基准使用：之后 get_ocr_engine() 创建全新的引擎，结果缓存只在内存中，
+    结果不受实机运行留下的缓存影响，也不改写 ocr_cache.json
+    """
+    global _persist_cache
+    _persist_cache = False
+    get_ocr_engine.cache_clear()
@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+# ========= ROI 内容指纹 =========
+def roi_key(image, lang, psm, whitelist):
+    """对 ROI 做 Otsu 二值化后按位打包求 blake2b 摘要，连同识别参数组成缓存键"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{gray.shape[0]}x{gray.shape[1]}|{lang}|{psm}|{whitelist or ''}|".encode("utf-8"))
+    h.update(np.packbits(binary).tobytes())
+    return h.hexdigest()
+
+
+# ========= LRU 结果缓存 =========
+class OcrCache:
+    """有界 LRU：key -> 识别文本；可选持久化到 JSON 文件，重启后仍然命中"""
+
+    def __init__(self, capacity, path=None):
+        self.capacity = capacity
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def get(self, key):
+        with self._lock:
+            text = self._data.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._data[key] = text
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _read_file(self):
+        """文件中按从旧到新保存的 [(key, text), ...]；不存在或损坏时返回 None"""
+        if not self.path or not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"警告：OCR 缓存文件无法读取，已忽略：{e}")
+            return None
+
+    def load(self):
+        entries = self._read_file()
+        if not entries:
+            return
+        with self._lock:
+            for key, text in entries[-self.capacity:]:
+                self._data[key] = text
+
+    def save(self):
+        """与文件中已有的条目合并后保存：多个识别进程共用同一个缓存文件，
+        只写自己的条目会覆盖其他进程保存的结果。临时文件按进程区分
+        """
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            entries = list(self._data.items())
+            self._dirty = False
+        own = {key for key, _ in entries}
+        # 文件中其他进程的条目视为更旧，排在前面，超出容量时先淘汰
+        merged = [(key, text) for key, text in (self._read_file() or ()) if key not in own] + entries
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(merged[-self.capacity:], f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"警告：保存 OCR 缓存失败：{e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
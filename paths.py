@@ -0,0 +1,28 @@
+import os
+import sys
+from functools import lru_cache
+
+# 路径函数单独成模块：config / event_log 等只需要路径的模块不必加载 cv2
+
+
+# ========= 获取资源路径 =========
+@lru_cache(maxsize=1)
+def resource_path(relative_path):
+    """获取资源路径，支持开发和 PyInstaller 打包"""
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+# ========= 获取应用路径 =========
+@lru_cache(maxsize=1)
+def base_dir_path():
+    """获取应用根目录"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.abspath(".")
+
+
+
+def default_log_path():
+    """默认的比赛日志 log.csv"""
+    return os.path.join(base_dir_path(), "log.csv")
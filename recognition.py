@@ -0,0 +1,439 @@
+import os
+import time
+import signal
+import threading
+import multiprocessing
+from collections import namedtuple, deque
+from functools import lru_cache
+from multiprocessing.connection import wait
+from vision import *
+from templates import get_template_bank
+from frames import FrameCrops
+from frame_ring import FrameRing
+from ocr import get_ocr_engine
+from lexicon import get_race_name_recognizer
+from digits import get_digit_recognizer
+from metrics import METRICS
+from config import *
+
+# screen：匹配到的画面（None 表示未识别）；data：应用阶段需要的识别结果；checked：实际执行的检查数
+Detection = namedtuple("Detection", "screen data checked")
+LOST = Detection(None, None, 0)
+
+DIAMOND_REGION = (420, 94, 515, 120)
+
+
+# ========= 纯识别（不修改任何记录状态，可在子进程中执行） =========
+# 道具模板编号 -> 道具名
+ITEM_NAMES = {
+    1: '钻石',
+    2: '女神像',
+}
+ITEM_RANGE = range(1, 3)
+LEVEL_LABELS = {"G1": "G1", "G2": "G2", "G3": "G3", "URA": "SP"}
+POSITION_LABELS = {"8 身位": "8L", "9 身位": "9L", "10身位": "10L", "大差距": "LON"}
+
+
+@lru_cache(maxsize=4)
+def template_sets(tpls):
+    """按模板库构建各区域的模板组（跨帧复用，记住各区域上次胜出的标签）"""
+    items = {"RACE_ITEM": tpls["RACE_ITEM"]}
+    for i in ITEM_RANGE:
+        items[f'ITEM_{i:02d}'] = tpls.get(f'ITEM_{i:02d}')
+    return {
+        "item_drop": TemplateSet(items),
+        "level": TemplateSet({label: tpls[key] for label, key in LEVEL_LABELS.items()}),
+        "position": TemplateSet({label: tpls[key] for label, key in POSITION_LABELS.items()}),
+    }
+
+
+def detect_item_drop(tpls, crops, pyr):
+    """道具掉落识别，返回找到的道具名列表"""
+    # 掉落标识和各道具在同一区域内匹配，共用区域的频谱
+    scores = template_sets(tpls)["item_drop"].on(crops, ROI_ITEM_DROP)
+    if scores.score("RACE_ITEM")[0] < MATCH_FINE:
+        return None
+    # 轮流匹配 item_01 到 item_10 并写入对应道具名
+    found_items = []  # 存储所有找到的道具
+    for i in ITEM_RANGE:
+        label = f'ITEM_{i:02d}'
+        if label in scores.tset.templates and scores.score(label)[0] >= 0.5:
+            found_items.append(ITEM_NAMES.get(i, f'item_{i:02d}'))
+    return {"items": found_items}
+
+
+def _is_win(crops):
+    # 检查屏幕上点 (500,700) 的色值是否为 #FFF5C7
+    try:
+        h, w = crops.shape[:2]
+        px_x, px_y = 500, 700
+        if 0 <= px_x < w and 0 <= px_y < h:
+            px = crops.bgr((px_x, px_y, px_x + 1, px_y + 1))[0, 0]
+            b = int(px[0])
+            g = int(px[1])
+            r = int(px[2])
+            #FFF5C7 -> RGB(255,245,199) -> BGR(199,245,255)
+            # Allow ±10 tolerance range for RGB values
+            return abs(r - 255) <= 10 and abs(g - 245) <= 10 and abs(b - 199) <= 10
+    except Exception:
+        pass
+    return False
+
+
+def detect_race_result(tpls, crops, pyr):
+    """比赛结算：胜负、等级、比赛名、身位；未匹配到等级时 level 为 None"""
+    rr = match_template_in_region(crops, tpls["RACE_RESULT"], ROI_RACE_RESULT, threshold=MATCH_FINE)
+    if not rr:
+        return None
+    data = {"success": _is_win(crops), "level": None, "name": None, "position": None}
+    # 匹配竞赛等级
+    data["level"] = template_sets(tpls)["level"].best(crops, REGION1)
+    if not data["level"]:
+        return data
+    # OCR 比赛名（吸附到已知比赛名，指纹命中时不做 OCR）
+    data["name"] = get_race_name_recognizer().recognize(
+        crops.bgr(REGION2),
+        lambda: ocr_region(REGION2, crops)
+    )
+    # 匹配身位差
+    data["position"] = template_sets(tpls)["position"].best(crops, REGION4) or "身位不足"
+    return data
+
+
+def detect_home(tpls, crops, pyr):
+    """主界面：识别钻石数（数字字形可靠时不做 OCR）"""
+    oh = match_template_pyramid(crops, tpls["OTHER_HOME"], threshold=0.6, pyramid=pyr)
+    if not oh:
+        return None
+    text = get_digit_recognizer().read(
+        crops.gray(DIAMOND_REGION),
+        lambda: get_ocr_engine().recognize(
+            crops.bgr(DIAMOND_REGION),
+            lang='eng', psm=7, whitelist='0123456789'
+        ).strip()
+    )
+    return {"text": text}
+
+
+def detect_jinhui(tpls, crops, pyr):
+    oj = match_template_pyramid(crops, tpls["OTHER_JINHUI"], threshold=MATCH_ROUGH, pyramid=pyr)
+    return {} if oj else None
+
+
+def detect_skip(tpls, crops, pyr):
+    """跳过/因子按钮的位置"""
+    loc = match_template_pyramid(crops, tpls["Skip"], threshold=MATCH_ROUGH, pyramid=pyr) or \
+          match_template_pyramid(crops, tpls["Yinzi"], threshold=MATCH_ROUGH, pyramid=pyr)
+    return {"tap": (loc[0], loc[1])} if loc else None
+
+
+def detect_jitaend(tpls, crops, pyr):
+    loc = match_template_pyramid(crops, tpls["JitaEnd"], threshold=MATCH_ROUGH, pyramid=pyr)
+    return {"tap": (loc[0], loc[1])} if loc else None
+
+
+DETECTORS = {
+    "item_drop": detect_item_drop,
+    "race_result": detect_race_result,
+    "home": detect_home,
+    "jinhui": detect_jinhui,
+    "skip": detect_skip,
+    "jitaend": detect_jitaend,
+}
+
+
+# 各检查会读取的全分辨率区域；None 表示整图匹配（主界面、跳过等），需要整帧灰度图生成金字塔
+DETECTOR_ROIS = {
+    "item_drop": (ROI_ITEM_DROP,),
+    "race_result": (ROI_RACE_RESULT, REGION1, REGION2, REGION4),
+    "home": None,
+    "jinhui": None,
+    "skip": None,
+    "jitaend": None,
+}
+
+
+def recognize_frame(screen_bgr, screen_gray, candidates, templates=None):
+    """按 candidates 顺序检查，返回第一个匹配的 Detection
+    候选中有整图匹配时整帧只转换一次灰度，各区域从中切片；
+    全部候选都只读声明区域时只转换这些区域，不生成整帧灰度图
+    """
+    tpls = templates or get_template_bank()
+    rois = [DETECTOR_ROIS[screen] for screen in candidates]
+    whole_frame = any(r is None for r in rois)
+    regions = () if whole_frame else [roi for r in rois for roi in r]
+    crops = FrameCrops(screen_bgr, regions, gray=screen_gray)
+    if whole_frame:
+        crops.gray()
+    # 整图匹配共享同一帧的金字塔（各层按需生成），先粗后细
+    pyr = ImagePyramid(crops)
+    checked = 0
+    detection = None
+    for screen in candidates:
+        checked += 1
+        data = DETECTORS[screen](tpls, crops, pyr)
+        if data is not None:
+            detection = Detection(screen, data, checked)
+            break
+    METRICS.inc("converted_pixels", crops.converted)
+    return detection or Detection(None, None, checked)
+
+
+# ========= 多进程识别 =========
+def _worker_main(conn, metrics_enabled=False):
+    """子进程入口：预加载模板、词典与 OCR 引擎，逐个处理任务。
+    每隔 RECOGNITION_REPORT_INTERVAL 秒向主进程报告本进程的 CPU 时间（截图 CPU 预算使用），
+    开启统计时同时发回子进程内记录的指标供主进程合并
+    """
+    # Ctrl+C 由主进程处理，子进程等待主进程通知退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    METRICS.enabled = metrics_enabled
+    try:
+        templates = get_template_bank()
+        get_race_name_recognizer()
+        engine = get_ocr_engine()
+    except Exception as e:
+        conn.send(("init", None, str(e)))
+        return
+    conn.send(("ready", os.getpid(), None))
+    rings = {}  # 共享内存名 -> 已打开的 FrameRing
+    reported_at = time.monotonic()
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            task_id, ring_spec, ring_seq, candidates = task
+            try:
+                ring = rings.get(ring_spec[0])
+                if ring is None:
+                    ring = rings[ring_spec[0]] = FrameRing.attach(ring_spec)
+                conn.send((task_id, _recognize_in_ring(ring, ring_seq, candidates, templates), None))
+            except Exception as e:
+                conn.send((task_id, None, str(e)))
+            if time.monotonic() - reported_at >= RECOGNITION_REPORT_INTERVAL:
+                conn.send(("report", _worker_report(metrics_enabled), None))
+                reported_at = time.monotonic()
+        conn.send(("report", _worker_report(metrics_enabled), None))
+    except (EOFError, OSError):
+        pass
+    finally:
+        if get_digit_recognizer.cache_info().currsize:
+            get_digit_recognizer().save()
+        engine.close()
+
+
+def _worker_report(metrics_enabled):
+    return {"cpu": time.process_time(), "metrics": METRICS.drain() if metrics_enabled else None}
+
+
+def _recognize_in_ring(ring, ring_seq, candidates, templates):
+    # 直接在共享内存视图上识别；期间帧被覆盖则结果作废
+    frame = ring.get(ring_seq)
+    if frame is None:
+        return LOST
+    detection = recognize_frame(frame, None, candidates, templates)
+    del frame
+    return detection if ring.valid(ring_seq) else LOST
+
+
+class _Worker:
+    __slots__ = ("index", "process", "conn", "task", "started", "cpu")
+
+    def __init__(self, index, ctx):
+        self.index = index
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, METRICS.enabled),
+                                   name=f"recognizer-proc-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self.task = None      # (task_id, recorder, seq)
+        self.started = 0.0
+        self.cpu = 0.0        # 子进程最近一次报告的 CPU 时间
+
+
+class ProcessRecognizer:
+    """多进程识别执行器：帧分发给 N 个预加载模板的子进程，结果交回 recorder.deliver(seq, detection)。
+    帧本身留在 recorder 的共享内存帧环中，任务只携带帧环名称和序号，子进程零拷贝读取。
+    由一个监督线程负责分发、收结果和健康检查：子进程退出或单帧超时会被重启，
+    该帧以 LOST 结果交回，保证 recorder 的按序应用不会卡住；已被帧环覆盖的帧不再分发。
+    """
+
+    def __init__(self, processes=RECOGNITION_PROCESSES, task_timeout=RECOGNITION_TASK_TIMEOUT):
+        self.processes = processes if processes > 0 else max(1, (os.cpu_count() or 2) - 1)
+        self.task_timeout = task_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_id = 0
+        self._inflight = {}   # recorder -> 已提交未完成的帧数
+        self.completed = 0
+        self.lost = 0
+        self.restarts = 0
+        self.failed = None    # 子进程初始化失败的原因；失败后不再重启，待识别帧全部以 LOST 交回
+        self._retired_cpu = 0.0  # 已重启的子进程报告过的 CPU 时间
+
+    def start(self):
+        self._workers = [_Worker(i, self._ctx) for i in range(self.processes)]
+        self._thread = threading.Thread(target=self._supervise, name="recognizer-supervisor", daemon=True)
+        self._thread.start()
+
+    def cpu_time(self):
+        """全部识别进程累计的 CPU 时间（秒，按各进程最近一次报告）"""
+        return self._retired_cpu + sum(w.cpu for w in self._workers)
+
+    def _apply_report(self, worker, report):
+        worker.cpu = report["cpu"]
+        if report["metrics"] is not None:
+            METRICS.merge(report["metrics"])
+
+    def inflight(self, recorder):
+        with self._lock:
+            return self._inflight.get(recorder, 0)
+
+    def submit(self, recorder, seq, ring, ring_seq, candidates):
+        """seq：recorder 内连续的帧序号（用于重排）；ring / ring_seq：帧在共享内存帧环中的位置"""
+        stale = []
+        with self._lock:
+            self._next_id += 1
+            self._pending.append((self._next_id, recorder, seq, ring, ring_seq, tuple(candidates)))
+            self._inflight[recorder] = self._inflight.get(recorder, 0) + 1
+            # 识别跟不上时，帧环已覆盖的旧任务直接作废，待分发任务数不超过帧环槽位数
+            if self._inflight[recorder] > ring.slots:
+                for task in list(self._pending):
+                    if task[1] is recorder and not task[3].valid(task[4]):
+                        self._pending.remove(task)
+                        self._inflight[recorder] -= 1
+                        stale.append(task[2])
+        for stale_seq in stale:
+            self._complete(recorder, stale_seq, LOST)
+        self._wake_w.send_bytes(b"")
+
+    def _complete(self, recorder, seq, detection, started=None):
+        if detection == LOST:
+            self.lost += 1
+            METRICS.inc("recognition_tasks", result="lost")
+        else:
+            self.completed += 1
+            METRICS.inc("recognition_tasks", result="ok")
+            METRICS.observe("stage", time.monotonic() - started, stage="recognize_process")
+        try:
+            recorder.deliver(seq, detection)
+        except Exception as e:
+            print(f"错误：应用识别结果失败：{e}")
+
+    def _finish(self, worker, detection):
+        _, recorder, seq = worker.task
+        worker.task = None
+        with self._lock:
+            self._inflight[recorder] -= 1
+        self._complete(recorder, seq, detection, worker.started)
+
+    def _restart(self, worker, reason):
+        print(f"警告：识别进程 {worker.index} {reason}，正在重启")
+        self.restarts += 1
+        METRICS.inc("recognition_restarts")
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=2)
+        worker.conn.close()
+        if worker.task is not None:
+            self._finish(worker, LOST)
+        self._retired_cpu += worker.cpu
+        self._workers[worker.index] = _Worker(worker.index, self._ctx)
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if self.failed is None and (worker.task is not None or not worker.process.is_alive()):
+                continue
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return
+                    task_id, recorder, seq, ring, ring_seq, candidates = self._pending.popleft()
+                    usable = self.failed is None and ring.valid(ring_seq)
+                    if not usable:
+                        self._inflight[recorder] -= 1
+                if usable:
+                    break
+                self._complete(recorder, seq, LOST)
+            worker.task = (task_id, recorder, seq)
+            worker.started = time.monotonic()
+            try:
+                worker.conn.send((task_id, ring.spec, ring_seq, candidates))
+            except (OSError, ValueError):
+                self._restart(worker, "连接已断开")
+
+    def _supervise(self):
+        while not self._stop.is_set():
+            self._dispatch()
+            conns = {w.conn: w for w in self._workers}
+            for conn in wait(list(conns) + [self._wake_r], timeout=0.5):
+                if conn is self._wake_r:
+                    while self._wake_r.poll():
+                        self._wake_r.recv_bytes()
+                    continue
+                worker = conns[conn]
+                try:
+                    task_id, result, error = conn.recv()
+                except (EOFError, OSError):
+                    self._restart(worker, "已退出")
+                    continue
+                if task_id == "ready":
+                    continue
+                if task_id == "report":
+                    self._apply_report(worker, result)
+                    continue
+                if task_id == "init":
+                    if self.failed is None:
+                        print(f"错误：识别进程初始化失败：{error}")
+                    self.failed = error
+                    continue
+                if worker.task is None or worker.task[0] != task_id:
+                    continue
+                if error is not None:
+                    print(f"处理帧时出错：{error}")
+                self._finish(worker, result if result is not None else LOST)
+            # 健康检查：进程意外退出或单帧超时
+            now = time.monotonic()
+            for worker in list(self._workers):
+                if self.failed is not None:
+                    break
+                if not worker.process.is_alive():
+                    self._restart(worker, "已退出")
+                elif worker.task is not None and now - worker.started > self.task_timeout:
+                    self._restart(worker, f"超过 {self.task_timeout}s 未返回")
+
+    def stop(self):
+        self._stop.set()
+        self._wake_w.send_bytes(b"")
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            self._collect_final_report(worker)
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def _collect_final_report(self, worker):
+        """读到子进程退出（EOF）为止：合并其最后一批指标，监督线程已停止，未读取的识别结果直接丢弃"""
+        try:
+            while worker.conn.poll(2):
+                task_id, result, _ = worker.conn.recv()
+                if task_id == "report":
+                    self._apply_report(worker, result)
+        except (EOFError, OSError):
+            pass
+
+    def describe(self):
+        return (f"识别进程：{self.processes} 个，完成 {self.completed} 帧，"
+                f"丢失 {self.lost} 帧，重启 {self.restarts} 次")
@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import time
+import json
+import zipfile
+import tempfile
+import argparse
+from datetime import datetime, timedelta
+from queue import Empty
+import cv2
+import numpy as np
+from frames import parse_raw_screencap
+from event_log import parse_row
+from config import CAPTURE_INTERVAL
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".raw")
+INDEX_NAME = "frames.csv"  # 可选索引：每行 文件名,unix时间戳（秒）
+
+
+# ========= 帧来源 =========
+def _natural_key(name):
+    return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', name)]
+
+
+def _decode(name, data):
+    if name.lower().endswith(".raw"):
+        return parse_raw_screencap(data)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _parse_index(text):
+    stamps = {}
+    for line in text.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2:
+            try:
+                stamps[parts[0]] = float(parts[1])
+            except ValueError:
+                continue
+    return stamps
+
+
+def iter_frames(source):
+    """按文件名自然顺序产出 (名称, 原始字节, 时间戳或 None)；支持目录与 zip"""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            names = zf.namelist()
+            stamps = {}
+            index = [n for n in names if os.path.basename(n) == INDEX_NAME]
+            if index:
+                stamps = _parse_index(zf.read(index[0]).decode("utf-8"))
+            for name in sorted((n for n in names if n.lower().endswith(IMAGE_EXTS)), key=_natural_key):
+                yield name, zf.read(name), stamps.get(os.path.basename(name))
+        return
+
+    index_path = os.path.join(source, INDEX_NAME)
+    stamps = {}
+    if os.path.isfile(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            stamps = _parse_index(f.read())
+    for name in sorted((n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTS)), key=_natural_key):
+        path = os.path.join(source, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        yield name, data, stamps.get(name, os.path.getmtime(path) if not stamps else None)
+
+
+# ========= 统计 =========
+def percentiles(samples, points=(50, 90, 99)):
+    if not samples:
+        return {f"p{p}": 0.0 for p in points}
+    arr = np.asarray(samples) * 1000.0
+    return {f"p{p}": float(np.percentile(arr, p)) for p in points}
+
+
+class InlineScheduler:
+    """回放用调度器：入队后立即在当前线程识别，并记录识别耗时"""
+
+    def __init__(self):
+        self.recognize_times = []
+
+    def notify(self, recorder):
+        while True:
+            try:
+                item = recorder.frame_queue.get_nowait()
+            except Empty:
+                return
+            t0 = time.perf_counter()
+            recorder.process_queued(item)
+            self.recognize_times.append(time.perf_counter() - t0)
+
+
+def read_events(log_file):
+    """读取日志中的事件（去掉时间列，便于与黄金文件比较）"""
+    events = []
+    with open(log_file, "r", encoding="utf-8-sig") as f:
+        f.readline()
+        for line in f:
+            if line.strip():
+                parts = parse_row(line)
+                events.append([parts[0]] + parts[2:])
+    return events
+
+
+# ========= 回放 =========
+def replay(source, realtime=False):
+    """把录制的截图逐帧送入 RaceRecorder，返回报告字典"""
+    from logic import RaceRecorder
+    from ocr import use_private_ocr_engine
+    from digits import use_private_digit_recognizer
+    from lexicon import use_private_race_name_recognizer
+
+    # OCR 缓存、数字字形和名称指纹使用全新且不落盘的实例：
+    # 回放结果不依赖之前的实机运行，回放也不改动实机运行的状态
+    use_private_ocr_engine()
+    use_private_digit_recognizer()
+    use_private_race_name_recognizer()
+
+    taps = []
+    scheduler = InlineScheduler()
+    tmp_dir = tempfile.TemporaryDirectory(prefix="replay_")
+    log_file = os.path.join(tmp_dir.name, "log.csv")
+    recorder = RaceRecorder(
+        "replay", log_file=log_file, scheduler=scheduler,
+        tap_func=lambda x, y: taps.append((int(x), int(y))),
+        sleep_func=lambda seconds: time.sleep(seconds) if realtime else None,
+    )
+
+    decode_times, frame_times = [], []
+    base = datetime(2000, 1, 1)
+    first_stamp = None
+    start = time.perf_counter()
+    frames = 0
+    for idx, (name, data, stamp) in enumerate(iter_frames(source)):
+        if stamp is None:
+            stamp = idx * CAPTURE_INTERVAL
+        if first_stamp is None:
+            first_stamp = stamp
+        offset = stamp - first_stamp
+        if realtime:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        t0 = time.perf_counter()
+        frame = _decode(name, data)
+        t1 = time.perf_counter()
+        decode_times.append(t1 - t0)
+        if frame is None:
+            print(f"警告：无法解码 {name}")
+            continue
+        # 使用录制时的相对时间，保证去重窗口与实机一致、结果可复现
+        recorder.process_frame(frame, now_dt=base + timedelta(seconds=offset))
+        frame_times.append(time.perf_counter() - t1)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    recorder.stop()
+    events = read_events(log_file)
+    tmp_dir.cleanup()
+
+    return {
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "skipped_static": recorder.change_detector.skipped,
+        "screen_checks": recorder.screen_state.stats(),
+        "latency_ms": {
+            "decode": percentiles(decode_times),
+            "process_frame": percentiles(frame_times),
+            "recognize": percentiles(scheduler.recognize_times),
+        },
+        "taps": taps,
+        "events": events,
+    }
+
+
+def compare_events(events, golden_path):
+    """与黄金文件比较，返回差异描述列表（为空表示一致）"""
+    with open(golden_path, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    diffs = []
+    for i in range(max(len(events), len(golden))):
+        got = events[i] if i < len(events) else None
+        want = golden[i] if i < len(golden) else None
+        if got != want:
+            diffs.append(f"#{i}: 期望 {want}，实际 {got}")
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放录制的截图并统计识别吞吐")
+    parser.add_argument("source", help="截图目录或 zip 包（png/jpg/raw，可附 frames.csv 时间索引）")
+    parser.add_argument("--realtime", action="store_true", help="按录制时的时间间隔回放（默认全速）")
+    parser.add_argument("--golden", help="与黄金事件文件比较，不一致时返回码为 1")
+    parser.add_argument("--write-golden", help="把本次事件写为黄金文件")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整报告")
+    args = parser.parse_args()
+
+    report = replay(args.source, realtime=args.realtime)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"帧数：{report['frames']}，耗时：{report['seconds']:.2f}s，吞吐：{report['fps']:.1f} fps，"
+              f"静态跳过：{report['skipped_static']}")
+        checks = report["screen_checks"]
+        if checks["frames"]:
+            print(f"画面检查：平均每帧 {checks['checks'] / checks['frames']:.2f} 项，回退 {checks['fallbacks']} 次")
+        for stage, pct in report["latency_ms"].items():
+            print(f"  {stage:<14}" + "  ".join(f"{k}={v:.2f}ms" for k, v in pct.items()))
+        print(f"点击：{len(report['taps'])} 次，事件：{len(report['events'])} 条")
+        for event in report["events"]:
+            print("  " + ",".join(event))
+
+    if args.write_golden:
+        with open(args.write_golden, "w", encoding="utf-8") as f:
+            json.dump(report["events"], f, ensure_ascii=False, indent=1)
+    if args.golden:
+        diffs = compare_events(report["events"], args.golden)
+        if diffs:
+            print(f"与黄金文件不一致（{len(diffs)} 处）：")
+            for d in diffs:
+                print("  " + d)
+            sys.exit(1)
+        print("与黄金文件一致。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import cv2
+from frames import RawFrame
+from config import CANONICAL_WIDTH, CANONICAL_HEIGHT
+
+# 宽高比与标准分辨率相差超过该比例时提示（区域和模板都按 9:16 截取）
+ASPECT_TOLERANCE = 0.01
+
+
+# ========= 分辨率换算 =========
+class ResolutionProfile:
+    """设备截图尺寸与标准识别分辨率（config 中的区域、模板、点击坐标均按此分辨率）之间的换算。
+    截图进入识别前缩放到标准分辨率，点击坐标再映射回设备坐标，
+    高分辨率设备的识别开销与 720x1280 设备相同。
+    """
+
+    def __init__(self, width, height, canonical=(CANONICAL_WIDTH, CANONICAL_HEIGHT)):
+        self.width = width
+        self.height = height
+        self.canonical = canonical
+        self.sx = width / canonical[0]
+        self.sy = height / canonical[1]
+        self.identity = (width, height) == tuple(canonical)
+        # 整数倍缩小时 INTER_AREA 走快速路径；非整数倍（如 1080p 的 1.5 倍）时
+        # INTER_AREA 约 18ms，INTER_LINEAR 约 3.5ms，按界面元素的尺寸线性插值已足够
+        integral = self.sx == self.sy and self.sx.is_integer()
+        self.interpolation = cv2.INTER_AREA if integral else cv2.INTER_LINEAR
+
+    @classmethod
+    def for_frame(cls, frame):
+        h, w = frame.shape[:2]
+        return cls(w, h)
+
+    def matches(self, frame):
+        h, w = frame.shape[:2]
+        return (w, h) == (self.width, self.height)
+
+    @property
+    def aspect_mismatch(self):
+        return abs(self.sx / self.sy - 1) > ASPECT_TOLERANCE
+
+    def normalize(self, frame):
+        """把 BGR 图像或 RawFrame 缩放到标准分辨率（标准尺寸的帧原样返回）"""
+        if self.identity:
+            return frame
+        if isinstance(frame, RawFrame):
+            return RawFrame(cv2.resize(frame.pixels, self.canonical, interpolation=self.interpolation),
+                            bgra=frame.bgra)
+        return cv2.resize(frame, self.canonical, interpolation=self.interpolation)
+
+    def to_device(self, x, y):
+        """标准分辨率坐标 -> 设备坐标"""
+        if self.identity:
+            return x, y
+        return int(round(x * self.sx)), int(round(y * self.sy))
+
+    def describe(self):
+        cw, ch = self.canonical
+        if self.identity:
+            return f"分辨率：{self.width}x{self.height}"
+        return f"分辨率：{self.width}x{self.height}，缩放到 {cw}x{ch} 识别"
@@ -0,0 +1,81 @@
+import threading
+from collections import deque
+from queue import Empty
+
+
+# ========= 多设备公平调度 =========
+class FairScheduler:
+    """多台设备共享的一组识别线程。
+    有待处理帧的设备按轮转顺序排队，每次只取一帧；同一设备同时最多一帧在处理，
+    保证单设备内按顺序识别，设备之间互不饿死。
+    """
+
+    def __init__(self, workers=1):
+        self.workers = max(1, workers)
+        self._ready = deque()
+        self._queued = set()
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"recognizer-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def notify(self, recorder):
+        """recorder 的队列中有新帧时调用"""
+        with self._cond:
+            if recorder in self._queued or recorder in self._busy:
+                return
+            self._queued.add(recorder)
+            self._ready.append(recorder)
+            self._cond.notify()
+
+    def _next(self):
+        with self._cond:
+            while not self._ready and not self._stop:
+                self._cond.wait(timeout=1)
+            if self._stop:
+                return None
+            recorder = self._ready.popleft()
+            self._queued.discard(recorder)
+            self._busy.add(recorder)
+            return recorder
+
+    def _done(self, recorder):
+        with self._cond:
+            self._busy.discard(recorder)
+            # 还有剩余帧则排到队尾，让其他设备先处理
+            if not recorder.frame_queue.empty():
+                self._queued.add(recorder)
+                self._ready.append(recorder)
+                self._cond.notify()
+
+    def _worker_loop(self):
+        while True:
+            recorder = self._next()
+            if recorder is None:
+                return
+            try:
+                item = recorder.frame_queue.get_nowait()
+            except Empty:
+                item = None
+            try:
+                if item is not None:
+                    recorder.process_queued(item)
+            except Exception:
+                # 捕获单帧处理异常，避免线程退出
+                pass
+            finally:
+                self._done(recorder)
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join(timeout=2)
@@ -0,0 +1,68 @@
+import threading
+from config import SCREEN_STATE_FALLBACK_SECONDS
+
+# 完整检查链（优先级从高到低）
+FULL_CHAIN = ("item_drop", "race_result", "home", "jinhui", "skip", "jitaend")
+
+# 需要记录的画面：只读固定小区域，开销很小，任何状态下都检查，
+# 避免误判的状态（如主界面按 0.6 宽松匹配）一直刷新而漏掉结算/掉落
+ALWAYS_CHECK = ("item_drop", "race_result")
+
+# 各状态之后可能出现的画面（含自身，ALWAYS_CHECK 另行加入）；未列出的状态使用完整检查链
+TRANSITIONS = {
+    "skip": ("skip", "jinhui", "jitaend"),
+    "race_result": ("race_result", "item_drop", "skip", "home"),
+    "item_drop": ("item_drop", "race_result", "skip", "home"),
+    "home": ("home", "skip", "jinhui"),
+    "jinhui": ("jinhui", "skip", "home"),
+    "jitaend": ("jitaend", "skip", "home"),
+}
+
+
+# ========= 画面状态跟踪 =========
+class ScreenStateTracker:
+    """记住上一次识别出的画面，只检查从该画面可能转移到的模板（结算/掉落总是检查）。
+    超过 fallback_seconds 没有任何匹配时回退到完整检查链。
+    多进程识别时 candidates() 在截图线程、update() 在应用线程调用，状态读写都加锁。
+    """
+
+    def __init__(self, transitions=TRANSITIONS, fallback_seconds=SCREEN_STATE_FALLBACK_SECONDS):
+        # 候选按完整链的优先级排序，保证同一帧的判定顺序与完整链一致
+        self.transitions = {
+            state: tuple(c for c in FULL_CHAIN if c in allowed or c in ALWAYS_CHECK)
+            for state, allowed in transitions.items()
+        }
+        self.fallback_seconds = fallback_seconds
+        self.state = None
+        self.since = None
+        self.frames = 0
+        self.checks = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def candidates(self, now):
+        """返回本帧需要依次检查的画面；now 为帧时间（秒）"""
+        with self._lock:
+            self.frames += 1
+            if self.state is None:
+                return FULL_CHAIN
+            if now - self.since > self.fallback_seconds:
+                self.fallbacks += 1
+                self.state = None
+                return FULL_CHAIN
+            return self.transitions.get(self.state, FULL_CHAIN)
+
+    def update(self, screen, checked, now):
+        """screen 为本帧匹配到的画面（未匹配为 None），checked 为实际执行的检查数"""
+        with self._lock:
+            self.checks += checked
+            if screen is not None:
+                self.since = now
+                self.state = screen
+
+    def stats(self):
+        return {"frames": self.frames, "checks": self.checks, "fallbacks": self.fallbacks}
+
+    def describe(self):
+        avg = self.checks / self.frames if self.frames else 0.0
+        return f"画面检查：平均每帧 {avg:.2f} 项（完整链 {len(FULL_CHAIN)} 项），回退 {self.fallbacks} 次"
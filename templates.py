@@ -0,0 +1,164 @@
+import os
+import json
+import cv2
+import numpy as np
+from functools import lru_cache
+import config as config_module
+
+TEMPLATE_PREFIX = "TEMPLATE_"
+BUNDLE_VERSION = 1
+
+
+# ========= 模板句柄 =========
+class Template:
+    """启动时加载好的灰度模板，匹配函数直接使用 image，不再读盘"""
+    __slots__ = ("name", "path", "image", "h", "w", "_levels")
+
+    def __init__(self, name, path, image):
+        self.name = name
+        self.path = path
+        self.image = image
+        self.h, self.w = image.shape[:2]
+        self._levels = {0: image}
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def level(self, n):
+        """金字塔第 n 层（边长缩小 2^n 倍），首次使用时生成并缓存"""
+        img = self._levels.get(n)
+        if img is None:
+            scale = 1 << n
+            size = (max(1, self.w // scale), max(1, self.h // scale))
+            img = cv2.resize(self.image, size, interpolation=cv2.INTER_AREA)
+            self._levels[n] = img
+        return img
+
+    def __repr__(self):
+        return f"Template({self.name}, {self.w}x{self.h})"
+
+
+# ========= 模板库 =========
+class TemplateBank:
+    """按名称（去掉 TEMPLATE_ 前缀的 config 常量名）保存所有模板句柄"""
+
+    def __init__(self, templates, missing=()):
+        self._templates = dict(templates)
+        self.missing = tuple(missing)
+
+    @classmethod
+    def from_config(cls, module=config_module, optional=None):
+        """读取 config 中全部 TEMPLATE_* 路径并解码为灰度图
+        必需模板缺失或无法解码时直接抛出 FileNotFoundError；
+        optional 中的模板缺失只记录在 missing 里。
+        """
+        if optional is None:
+            optional = getattr(module, "OPTIONAL_TEMPLATES", ())
+        optional = set(optional)
+
+        templates = {}
+        missing = []
+        broken = []
+        for name, path in _template_paths(module):
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE) if os.path.isfile(path) else None
+            if image is None or image.size == 0:
+                if name in optional:
+                    missing.append(name)
+                else:
+                    broken.append(path)
+                continue
+            templates[name] = Template(name, path, image)
+
+        if broken:
+            raise FileNotFoundError("模板缺失或无法读取：" + "，".join(broken))
+        return cls(templates, missing)
+
+    @classmethod
+    def from_bundle(cls, path, module=config_module):
+        """从 build_bundle 生成的包加载：像素以内存映射方式一次打开，不逐个读取和解码 PNG。
+        包不存在、版本不符或与 config 中的模板文件不一致（文件被修改、新增）时返回 None。
+        """
+        try:
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                index = json.load(f)
+            pixels = np.load(path + ".npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != BUNDLE_VERSION:
+            return None
+        entries = index["templates"]
+        optional = getattr(module, "OPTIONAL_TEMPLATES", ())
+        for name, src in _template_paths(module):
+            entry = entries.get(name)
+            try:
+                st = os.stat(src)
+            except OSError:
+                if entry is None and name not in optional:
+                    # 必需模板既不在包里也没有文件，交给 from_config 报错
+                    return None
+                # 打包后只分发模板包时源文件不存在，以包为准
+                continue
+            if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime_ns:
+                print(f"提示：模板包已过期（{name}），改为读取模板文件；可运行 main.py bundle 重新生成")
+                return None
+
+        templates = {}
+        for name, entry in entries.items():
+            h, w, offset = entry["h"], entry["w"], entry["offset"]
+            image = pixels[offset:offset + h * w].reshape(h, w)
+            templates[name] = Template(name, getattr(module, TEMPLATE_PREFIX + name, path), image)
+        return cls(templates, [name for name in optional if name not in templates])
+
+    def __getitem__(self, name):
+        return self._templates[name]
+
+    def __contains__(self, name):
+        return name in self._templates
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __iter__(self):
+        return iter(self._templates.values())
+
+    def get(self, name, default=None):
+        return self._templates.get(name, default)
+
+    def names(self):
+        return list(self._templates)
+
+
+def _template_paths(module):
+    for attr in sorted(dir(module)):
+        path = getattr(module, attr)
+        if attr.startswith(TEMPLATE_PREFIX) and isinstance(path, str):
+            yield attr[len(TEMPLATE_PREFIX):], path
+
+
+# ========= 模板包 =========
+def build_bundle(path=config_module.ASSET_BUNDLE, module=config_module):
+    """把 config 中全部模板打包为 path.npy（所有像素首尾相接）和 path.json（名称 -> 偏移、尺寸、源文件信息）
+    返回打包的模板数
+    """
+    bank = TemplateBank.from_config(module)
+    entries = {}
+    chunks = []
+    offset = 0
+    for tmpl in bank:
+        st = os.stat(tmpl.path)
+        entries[tmpl.name] = {"offset": offset, "h": tmpl.h, "w": tmpl.w,
+                              "source": os.path.basename(tmpl.path),
+                              "size": st.st_size, "mtime": st.st_mtime_ns}
+        chunks.append(tmpl.image.ravel())
+        offset += tmpl.image.size
+    np.save(path + ".npy", np.concatenate(chunks) if chunks else np.zeros(0, np.uint8))
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"version": BUNDLE_VERSION, "templates": entries}, f, ensure_ascii=False, indent=1)
+    return len(entries)
+
+
+@lru_cache(maxsize=1)
+def get_template_bank():
+    """进程内共享的模板库，首次调用时加载并校验；有最新的模板包时直接映射模板包"""
+    return TemplateBank.from_bundle(config_module.ASSET_BUNDLE) or TemplateBank.from_config()
@@ -0,0 +1,59 @@
+import time
+import struct
+import cv2
+import numpy as np
+import pytest
+from adb_client import AdbClient, AdbError
+from fake_adb import FakeAdbServer, FakeDevice
+
+
+@pytest.fixture
+def adb():
+    screens = [np.full((64, 36, 3), value, np.uint8) for value in (40, 200)]
+    device = FakeDevice("emulator-5554", screens)
+    server = FakeAdbServer([device], port=0)
+    server.start()
+    client = AdbClient(port=server.server_address[1])
+    yield client, device, server
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for_taps(device, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(device.taps) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return [(x, y) for _, x, y, _, _ in device.taps]
+
+
+def test_devices_and_shell(adb):
+    client, _, _ = adb
+    assert client.devices() == [("emulator-5554", "device")]
+    assert client.shell("emulator-5554", "wm size").strip() == "Physical size: 36x64"
+
+
+def test_screencap_png_and_raw(adb):
+    client, _, _ = adb
+    png = cv2.imdecode(np.frombuffer(client.screencap("emulator-5554"), np.uint8), cv2.IMREAD_COLOR)
+    assert png.shape == (64, 36, 3) and int(png[0, 0, 0]) == 40
+    raw = client.screencap("emulator-5554", png=False)
+    width, height, _, _ = struct.unpack("<IIII", raw[:16])
+    assert (width, height) == (36, 64)
+    assert len(raw) == 16 + width * height * 4
+
+
+def test_unknown_device(adb):
+    client, _, _ = adb
+    with pytest.raises(AdbError):
+        client.shell("emulator-9999", "wm size")
+
+
+def test_tap_reconnects_after_session_closed(adb):
+    client, device, server = adb
+    client.tap("emulator-5554", 10, 20)
+    assert wait_for_taps(device, 1) == [(10, 20)]
+    server.drop_sessions()
+    time.sleep(0.1)
+    client.tap("emulator-5554", 30, 40)
+    assert wait_for_taps(device, 2) == [(10, 20), (30, 40)]
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+from config import REGION2
+from lexicon import RaceLexicon, RaceNameRecognizer, name_fingerprint
+
+
+def render_name(text):
+    """按 REGION2 的尺寸渲染白底黑字的名称裁剪"""
+    x1, y1, x2, y2 = REGION2
+    crop = np.full((y2 - y1, x2 - x1, 3), 255, np.uint8)
+    cv2.putText(crop, text, (8, 36), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    return crop
+
+
+class FakeOcr:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.text
+
+
+def test_neighbouring_names_are_not_taken_from_fingerprints():
+    lexicon = RaceLexicon(["URA-Semi1", "URA-Semi2", "JapanCup"])
+    recognizer = RaceNameRecognizer(lexicon)
+    first, second = FakeOcr("URA-Semi1"), FakeOcr("URA-Semi2")
+    assert recognizer.recognize(render_name("URA-Semi1"), first) == "URA-Semi1"
+    assert recognizer.recognize(render_name("URA-Semi2"), second) == "URA-Semi2"
+    assert (first.calls, second.calls) == (1, 1)
+    assert recognizer.fingerprint_hits == 0
+
+
+def test_same_crop_skips_ocr():
+    recognizer = RaceNameRecognizer(RaceLexicon(["URA-Semi1", "URA-Semi2", "JapanCup"]))
+    ocr = FakeOcr("JapanCup")
+    for _ in range(3):
+        assert recognizer.recognize(render_name("JapanCup"), ocr) == "JapanCup"
+    assert ocr.calls == 1
+    assert recognizer.fingerprint_hits == 2
+
+
+def test_one_glyph_difference_exceeds_fingerprint_limit():
+    recognizer = RaceNameRecognizer(RaceLexicon([]))
+    a = name_fingerprint(render_name("CupA"))
+    b = name_fingerprint(render_name("CupB"))
+    recognizer.fingerprints.add(a, "CupA")
+    assert recognizer.fingerprints.lookup(b) is None
@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+from templates import Template
+from vision import TemplateSet
+
+
+def textured(shape, seed):
+    rng = np.random.default_rng(seed)
+    return cv2.GaussianBlur(rng.integers(0, 256, size=shape, dtype=np.uint8), (5, 5), 0)
+
+
+def test_scores_match_opencv():
+    roi = textured((120, 160), 0)
+    region = (10, 20, 170, 140)
+    frame = np.zeros((150, 180), np.uint8)
+    frame[20:140, 10:170] = roi
+    templates = {
+        "a": Template("a", "", roi[10:40, 10:50].copy()),
+        "b": Template("b", "", roi[60:90, 90:130].copy()),
+        "big": Template("big", "", np.zeros((200, 10), np.uint8)),
+    }
+    scores = TemplateSet(templates).on(frame, region)
+    for label in ("a", "b"):
+        expected = cv2.matchTemplate(roi, templates[label].image, cv2.TM_CCOEFF_NORMED)
+        _, exp_val, _, (ex, ey) = cv2.minMaxLoc(expected)
+        assert scores.score(label) == (exp_val, (region[0] + ex, region[1] + ey))
+    assert scores.score("big") == (-1.0, None)
+
+
+def test_best_picks_the_highest_score():
+    roi = textured((120, 160), 1)
+    exact = roi[60:90, 90:130].copy()
+    # 同一位置的模板加噪声：仍高于阈值，但得分明显低于原样截取的模板
+    noisy = (exact.astype(np.int16) + np.random.default_rng(2).integers(-12, 13, exact.shape)).clip(0, 255)
+    templates = {
+        "noisy": Template("noisy", "", noisy.astype(np.uint8)),
+        "exact": Template("exact", "", exact),
+    }
+    tset = TemplateSet(templates, clear_win=1.1)
+    scores = tset.on(roi, (0, 0, 160, 120))
+    assert 0.9 < scores.score("noisy")[0] < scores.score("exact")[0] - 0.01
+    assert tset.best(roi, (0, 0, 160, 120), threshold=0.9) == "exact"
+    assert tset.best(roi, (0, 0, 160, 120), threshold=1.1) is None
@@ -1,32 +1,51 @@
-import os
-import sys
 import subprocess
 import cv2
 import numpy as np
-from functools import lru_cache
-
-# ========= 获取资源路径 =========
-@lru_cache(maxsize=1)
-def resource_path(relative_path):
-    """获取资源路径，支持开发和 PyInstaller 打包"""
-    if hasattr(sys, '_MEIPASS'):
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.join(os.path.abspath("."), relative_path)
-
-# ========= 获取应用路径 =========
-@lru_cache(maxsize=1)
-def base_dir_path():
-    """获取应用根目录"""
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)
-    return os.path.abspath(".")
+from adb_client import get_adb_client, AdbError
+from frames import parse_raw_screencap
+from metrics import METRICS
+from paths import resource_path
 
 # ========= ADB路径配置 =========
 ADB_PATH = resource_path("assets/adbtools/adb.exe")
 
+# ========= ADB连接方式 =========
+# None=尚未探测，True=直连 adb server，False=回退到逐次启动 adb 进程
+_adb_native = None
+
+def _native_client():
+    """返回可用的 ADB 直连客户端；server 未运行时用 adb start-server 拉起一次，仍失败则回退"""
+    global _adb_native
+    if _adb_native is False:
+        return None
+    client = get_adb_client()
+    if _adb_native is None:
+        try:
+            client.devices()
+        except (OSError, AdbError):
+            try:
+                subprocess.check_call(
+                    [ADB_PATH, "start-server"],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+                client.devices()
+            except Exception:
+                _adb_native = False
+                return None
+        _adb_native = True
+    return client
+
 # ========= 列出ADB设备 =========
 def list_connected_devices():
     """列出所有已连接的 ADB 设备"""
+    client = _native_client()
+    if client is not None:
+        try:
+            return [serial for serial, state in client.devices() if state == "device"]
+        except (OSError, AdbError) as e:
+            print(f"错误：列举设备失败：{e}")
+            return []
     try:
         raw = subprocess.check_output(
             [ADB_PATH, "devices"], 
@@ -70,20 +89,55 @@ def choose_device_interactively(devices):
         
         print("输入不合法，请重新输入。")
 
+# ========= 截图方式 =========
+# raw：screencap 原始帧，设备端不做 PNG 编码，主机端零拷贝解析
+# png：screencap -p + cv2.imdecode，兼容性最好
+DEFAULT_CAPTURE_MODE = "raw"
+_capture_modes = {}
+
+def set_capture_mode(device_id, mode):
+    """为指定设备选择截图方式（raw 或 png）"""
+    if mode not in ("raw", "png"):
+        raise ValueError(f"未知截图方式：{mode}")
+    _capture_modes[device_id] = mode
+
+def get_capture_mode(device_id):
+    return _capture_modes.get(device_id, DEFAULT_CAPTURE_MODE)
+
+def _screencap_bytes(device_id, png):
+    client = _native_client()
+    if client is not None:
+        return client.screencap(device_id, png=png)
+    cmd = [ADB_PATH, "-s", device_id, "exec-out", "screencap"] + (["-p"] if png else [])
+    return subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+
 # ========= ADB截图 =========
 def adb_screenshot(device_id):
-    """从指定设备截图并返回 OpenCV BGR 图像，失败返回 None"""
+    """从指定设备截图，失败返回 None
+    png 模式返回 OpenCV BGR 图像；raw 模式返回 frames.RawFrame（按区域按需转换）
+    """
     try:
-        cmd = [ADB_PATH, "-s", device_id, "exec-out", "screencap", "-p"]
-        png_bytes = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
-        
-        img = cv2.imdecode(np.frombuffer(png_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if get_capture_mode(device_id) == "raw":
+            with METRICS.timer("stage", stage="capture", device=device_id):
+                data = _screencap_bytes(device_id, png=False)
+            with METRICS.timer("stage", stage="decode", device=device_id):
+                frame = parse_raw_screencap(data)
+            if frame is not None:
+                return frame
+            # 原始格式无法解析时，该设备改用 PNG
+            print(f"提示：设备 {device_id} 的原始帧格式不受支持，改用 PNG 截图")
+            set_capture_mode(device_id, "png")
+
+        with METRICS.timer("stage", stage="capture", device=device_id):
+            png_bytes = _screencap_bytes(device_id, png=True)
+        with METRICS.timer("stage", stage="decode", device=device_id):
+            img = cv2.imdecode(np.frombuffer(png_bytes, np.uint8), cv2.IMREAD_COLOR)
         if img is None:
             print(f"警告：截图数据无效（设备: {device_id}）")
             return None
         
         return img
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, AdbError, OSError):
         print(f"警告：ADB 截图失败（设备: {device_id}）")
         return None
     except Exception as e:
@@ -94,12 +148,16 @@ def adb_screenshot(device_id):
 def adb_tap(device_id, x, y):
     """使用 ADB 点击设备坐标 (x, y)"""
     try:
+        client = _native_client()
+        if client is not None:
+            client.tap(device_id, x, y)
+            return
         subprocess.check_call(
             [ADB_PATH, "-s", device_id, "shell", "input", "tap", str(int(x)), str(int(y))],
             stdout=subprocess.DEVNULL, 
             stderr=subprocess.DEVNULL
         )
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, AdbError, OSError):
         print(f"警告：点击失败（坐标: {x}, {y}）")
     except Exception as e:
         print(f"错误：点击异常：{e}")
\ No newline at end of file
@@ -1,128 +1,218 @@
 import cv2
-import pytesseract
-from utils import resource_path
-from config import REGION5, MATCH_FINE, MATCH_ROUGH
-import os
+from frames import crop_bgr, FrameCrops
+from ocr import get_ocr_engine
+from digits import get_digit_recognizer
+from metrics import METRICS
+from config import MATCH_FINE, MATCH_ROUGH
+from config import PYRAMID_MAX_LEVEL, PYRAMID_MIN_TEMPLATE, PYRAMID_CANDIDATES, PYRAMID_COARSE_MARGIN
+from config import TEMPLATE_SET_CLEAR_WIN
 import re
 
 
 
-# OCR
-pytesseract.pytesseract.tesseract_cmd = resource_path("assets/tessdata/tesseract.exe")
-os.environ['TESSDATA_PREFIX'] = resource_path("assets/tessdata/tessdata")
 MATCH_FINE = 0.99
 MATCH_ROUGH = 0.8
 
 
-# ========= 模板匹配函数 =========
-def match_template(img_gray, template_path, threshold=MATCH_FINE):
-    tmpl = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    if tmpl is None:
-        print(f"[错误] 模板不存在：{template_path}")
-        return False
-    res = cv2.matchTemplate(img_gray, tmpl, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, _ = cv2.minMaxLoc(res)
-    return max_val >= threshold
-
-
-
-
-# ========= 匹配道具模板函数 =========
-def MATCH_ROUGHtemplate(img_gray, template_path, threshold=MATCH_ROUGH):
-    # 只在REGION5区域内进行匹配
-    x1, y1, x2, y2 = REGION5
-    roi = img_gray[y1:y2, x1:x2]
-    tmpl = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    if tmpl is None:
-        print(f"[错误] 模板不存在：{template_path}")
-        return False
-    if roi.shape[0] < tmpl.shape[0] or roi.shape[1] < tmpl.shape[1]:
-        print("[错误] ROI区域小于模板，无法匹配")
-        return False
-    res = cv2.matchTemplate(roi, tmpl, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, _ = cv2.minMaxLoc(res)
-    return max_val >= threshold
-
-# ========= 匹配模板标签函数 =========
-def match_template_label(img_gray, roi_coords, template_dict):
-    x1, y1, x2, y2 = roi_coords
-    roi = img_gray[y1:y2, x1:x2]
-    best_label = None
-    best_score = 0
-    for label, path in template_dict.items():
-        tmpl = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        if tmpl is None or roi.shape[0] < tmpl.shape[0] or roi.shape[1] < tmpl.shape[1]:
-            continue
-        res = cv2.matchTemplate(roi, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(res)
-        #print(f"[匹配度] 模板 {label} 最大匹配值: {max_val:.4f}")
-        if max_val > best_score and max_val >= MATCH_FINE:
-            best_score = max_val
-            best_label = label
-    return best_label
-
-
-
-
-
-
-
+# 以下匹配函数的 img_gray 既可以是灰度图，也可以是 FrameCrops（只转换读取到的区域）
+def _gray_roi(img_gray, region):
+    if isinstance(img_gray, FrameCrops):
+        return img_gray.gray(region)
+    x1, y1, x2, y2 = region
+    return img_gray[y1:y2, x1:x2]
 
 
+def _full_gray(img_gray):
+    return img_gray.gray() if isinstance(img_gray, FrameCrops) else img_gray
 
 
-def match_template_loc(img_gray, template_path, threshold=MATCH_FINE):
+# ========= 模板匹配函数 =========
+def match_template_loc(img_gray, tmpl, threshold=MATCH_FINE):
     """
     在整张灰度图上匹配模板，返回匹配中心坐标 (cx, cy) 和匹配矩形 (x, y, w, h)
     若未达到阈值返回 None
     """
-    tmpl = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    if tmpl is None:
-        # 模板不存在
-        return None
-    if img_gray.shape[0] < tmpl.shape[0] or img_gray.shape[1] < tmpl.shape[1]:
+    if img_gray.shape[0] < tmpl.h or img_gray.shape[1] < tmpl.w:
         return None
-    res = cv2.matchTemplate(img_gray, tmpl, cv2.TM_CCOEFF_NORMED)
+    with METRICS.timer("template_match", template=tmpl.name, method="full"):
+        res = cv2.matchTemplate(_full_gray(img_gray), tmpl.image, cv2.TM_CCOEFF_NORMED)
     min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
     if max_val < threshold:
         return None
     tx, ty = max_loc
-    h, w = tmpl.shape
+    h, w = tmpl.h, tmpl.w
     cx = tx + w // 2
     cy = ty + h // 2
     return (cx, cy, tx, ty, w, h, max_val)
 
 
-def match_template_in_region(img_gray, template_path, region, threshold=MATCH_FINE):
+def match_template_in_region(img_gray, tmpl, region, threshold=MATCH_FINE):
     """
     在指定区域 (x1,y1,x2,y2) 内匹配模板，返回与 match_template_loc 相同的元组 (cx,cy,tx,ty,w,h,val)
     未达到阈值返回 None
     """
+    with METRICS.timer("template_match", template=tmpl.name, method="region"):
+        return _match_in_region(img_gray, tmpl, region, threshold)
+
+
+def _match_in_region(img_gray, tmpl, region, threshold):
     x1, y1, x2, y2 = region
-    roi = img_gray[y1:y2, x1:x2]
-    tmpl = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    if tmpl is None:
+    roi = _gray_roi(img_gray, region)
+    if roi.shape[0] < tmpl.h or roi.shape[1] < tmpl.w:
         return None
-    if roi.shape[0] < tmpl.shape[0] or roi.shape[1] < tmpl.shape[1]:
-        return None
-    res = cv2.matchTemplate(roi, tmpl, cv2.TM_CCOEFF_NORMED)
+    res = cv2.matchTemplate(roi, tmpl.image, cv2.TM_CCOEFF_NORMED)
     min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
     if max_val < threshold:
         return None
     tx, ty = max_loc
-    h, w = tmpl.shape
+    h, w = tmpl.h, tmpl.w
     cx = x1 + tx + w // 2
     cy = y1 + ty + h // 2
 
     return (cx, cy, x1 + tx, y1 + ty, w, h, max_val)
 
 
+# ========= 金字塔匹配 =========
+class ImagePyramid:
+    """单帧灰度图的金字塔，各层按需生成并缓存，供同一帧的多个模板共享。
+    由 FrameCrops 构造时缩小层直接由原始像素生成，不需要整帧灰度图。
+    """
+
+    def __init__(self, img_gray):
+        self.base = img_gray
+        self._levels = {}
+
+    def level(self, n):
+        img = self._levels.get(n)
+        if img is None:
+            scale = 1 << n
+            if n == 0:
+                img = _full_gray(self.base)
+            elif isinstance(self.base, FrameCrops):
+                img = self.base.scaled_gray(scale)
+            else:
+                h, w = self.base.shape[:2]
+                img = cv2.resize(self.base, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+            self._levels[n] = img
+        return img
+
+
+def _pyramid_level_for(tmpl, max_level=PYRAMID_MAX_LEVEL):
+    """选择模板缩小后仍不小于 PYRAMID_MIN_TEMPLATE 的最高层"""
+    level = max_level
+    while level > 0 and min(tmpl.h, tmpl.w) >> level < PYRAMID_MIN_TEMPLATE:
+        level -= 1
+    return level
+
+
+def match_template_pyramid(img_gray, tmpl, threshold=MATCH_FINE, pyramid=None,
+                           candidates=PYRAMID_CANDIDATES):
+    """
+    由粗到细的整图模板匹配：先在缩小的帧上找若干候选峰值，再在原图候选附近精匹配。
+    返回与 match_template_loc 相同的元组 (cx,cy,tx,ty,w,h,val)，未达到阈值返回 None
+    """
+    if pyramid is None:
+        pyramid = ImagePyramid(img_gray)
+    level = _pyramid_level_for(tmpl)
+    if level == 0:
+        return match_template_loc(img_gray, tmpl, threshold=threshold)
+    with METRICS.timer("template_match", template=tmpl.name, method="pyramid"):
+        return _match_pyramid(img_gray, tmpl, threshold, pyramid, level, candidates)
+
+
+def _match_pyramid(img_gray, tmpl, threshold, pyramid, level, candidates):
+
+    small = pyramid.level(level)
+    small_tmpl = tmpl.level(level)
+    if small.shape[0] < small_tmpl.shape[0] or small.shape[1] < small_tmpl.shape[1]:
+        return None
+    res = cv2.matchTemplate(small, small_tmpl, cv2.TM_CCOEFF_NORMED)
+
+    scale = 1 << level
+    pad = scale * 2
+    sh, sw = small_tmpl.shape
+    coarse_threshold = threshold - PYRAMID_COARSE_MARGIN
+    best = None
+    for _ in range(candidates):
+        _, coarse_val, _, (sx, sy) = cv2.minMaxLoc(res)
+        if coarse_val < coarse_threshold:
+            break
+        # 在原图候选位置附近精匹配
+        region = (max(0, sx * scale - pad), max(0, sy * scale - pad),
+                  min(img_gray.shape[1], sx * scale + tmpl.w + pad),
+                  min(img_gray.shape[0], sy * scale + tmpl.h + pad))
+        loc = _match_in_region(img_gray, tmpl, region, threshold)
+        if loc and (best is None or loc[6] > best[6]):
+            best = loc
+        # 抑制该峰值邻域，继续寻找下一个候选
+        res[max(0, sy - sh // 2):sy + sh // 2 + 1, max(0, sx - sw // 2):sx + sw // 2 + 1] = -1
+    return best
+
+
+# ========= 模板组批量匹配 =========
+class TemplateSet:
+    """同一区域内匹配一组模板（等级、身位、道具等），得分即 TM_CCOEFF_NORMED。
+    同一帧同一区域的多个模板共享一次区域裁剪，各标签得分在会话内缓存；
+    best() 在某个标签得分达到 clear_win 时提前结束，并把上次胜出的标签排在最前。
+    """
+
+    def __init__(self, templates, clear_win=TEMPLATE_SET_CLEAR_WIN):
+        self.templates = {label: tmpl for label, tmpl in templates.items() if tmpl is not None}
+        self.clear_win = clear_win
+        self._last_winner = None
+
+    def on(self, img_gray, region):
+        """返回该帧该区域的匹配会话，同一会话内的多个模板共享区域裁剪"""
+        return _RegionScores(self, _gray_roi(img_gray, region), region)
+
+    def best(self, img_gray, region, threshold=MATCH_FINE):
+        """得分最高且不低于 threshold 的标签，没有返回 None"""
+        scores = self.on(img_gray, region)
+        order = list(self.templates)
+        last = self._last_winner
+        if last in self.templates:
+            order.remove(last)
+            order.insert(0, last)
+        best_label, best_score = None, 0
+        for label in order:
+            val = scores.score(label)[0]
+            if val > best_score and val >= threshold:
+                best_label, best_score = label, val
+                if val >= self.clear_win:
+                    break
+        if best_label is not None:
+            self._last_winner = best_label
+        return best_label
+
+
+class _RegionScores:
+    """单个区域的匹配会话：各标签的得分按需计算并缓存"""
+
+    def __init__(self, tset, roi, region):
+        self.tset = tset
+        self.roi = roi
+        self.origin = (region[0], region[1])
+        self._scores = {}
+
+    def score(self, label):
+        """(最高得分, (tx, ty) 原图坐标)；区域小于模板时为 (-1, None)"""
+        result = self._scores.get(label)
+        if result is None:
+            tmpl = self.tset.templates[label]
+            if self.roi.shape[0] < tmpl.h or self.roi.shape[1] < tmpl.w:
+                result = (-1.0, None)
+            else:
+                with METRICS.timer("template_match", template=tmpl.name, method="set"):
+                    res = cv2.matchTemplate(self.roi, tmpl.image, cv2.TM_CCOEFF_NORMED)
+                _, max_val, _, (tx, ty) = cv2.minMaxLoc(res)
+                result = (max_val, (self.origin[0] + tx, self.origin[1] + ty))
+            self._scores[label] = result
+        return result
 
 
 def ocr_number_region(region, image_bgr, psm=7):
-    """在指定区域进行数字 OCR，返回纯数字字符串或空字符串；同时保存二值化图片用于调试"""
-    x1, y1, x2, y2 = region
-    roi = image_bgr[y1:y2, x1:x2]
+    """在指定区域识别数字，返回纯数字字符串或空字符串；数字字形置信度不足时才做 OCR"""
+    roi = crop_bgr(image_bgr, region)
     roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
 
     # 转灰度并做 Otsu 二值化，提高识别率
@@ -130,17 +220,16 @@ def ocr_number_region(region, image_bgr, psm=7):
     _, roi_bin = cv2.threshold(roi_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
     # 用二值图做 OCR（只允许数字）
-    config = f'--psm {psm} -c tessedit_char_whitelist=0123456789'
-    text = pytesseract.image_to_string(roi_bin, lang='chi_sim', config=config)
-    text = re.sub(r'[^0-9]', '', text or '')
-    return text
+    def ocr():
+        text = get_ocr_engine().recognize(roi_bin, lang='chi_sim', psm=psm, whitelist='0123456789')
+        return re.sub(r'[^0-9]', '', text or '')
+    return get_digit_recognizer().read(roi_gray, ocr)
 
 
 # ========= OCR辅助函数 =========
 def ocr_region(region, image_bgr):
-    x1, y1, x2, y2 = region
-    roi = image_bgr[y1:y2, x1:x2]
+    roi = crop_bgr(image_bgr, region)
     roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
     #allowed_chars = "京皋青东小札紫神菊全挑中日钻阪天新目鸣宝函白都月叶仓幌苑户花国战山经石王潟黑尾冢馆银总初奖优纪锦杯大邀级闻骏念标春请赛决秋预半德比顺逆外内中长距离草地URAm0123456789·()"
-    text = pytesseract.image_to_string(roi_rgb, lang='chi_sim', config=f'--psm 7 ').strip()
+    text = get_ocr_engine().recognize(roi_rgb, lang='chi_sim', psm=7).strip()
     return text
\ No newline at end of file